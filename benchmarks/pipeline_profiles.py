@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Compare the speed of the spaCy pipeline profiles."""
+
+import argparse
+import sys
+import textwrap
+import time
+from itertools import islice
+
+import downloader
+from efloras.pylib import page_store
+from efloras.pylib.pipeline import PROFILES, pipeline
+from efloras.readers.efloras import read_page
+
+
+def main(args):
+    """Time each profile over the same treatments."""
+    texts = get_texts(args)
+
+    if not texts:
+        sys.exit('No treatment text to parse')
+
+    ents = {}
+    times = {}
+    tokens = 0
+    for profile in PROFILES:
+        nlp = pipeline(profile=profile)
+        start = time.perf_counter()
+        docs = list(nlp.pipe(texts, batch_size=args.batch_size))
+        times[profile] = time.perf_counter() - start
+        ents[profile] = [[e._.data for e in d.ents] for d in docs]
+        tokens = sum(len(d) for d in docs)
+
+    baseline = times['full']
+    template = '{:<8} {:>10} {:>10} {:>12} {:>8}'
+    print(template.format(
+        'Profile', 'Seconds', 'Docs/sec', 'Tokens/sec', 'Speedup'))
+    for profile, elapsed in times.items():
+        print(template.format(
+            profile,
+            f'{elapsed:.3f}',
+            f'{len(texts) / elapsed:.1f}',
+            f'{tokens / elapsed:.0f}',
+            f'{baseline / elapsed:.2f}x'))
+
+    diffs = sum(1 for a, b in zip(ents['full'], ents['minimal']) if a != b)
+    if diffs:
+        print(f'{diffs} treatments have different traits')
+        sys.exit(1)
+
+
+def get_texts(args):
+    """Get the trait paragraphs from a downloaded family."""
+    root = downloader.family_dir(args.flora_id, args.family)
+    store = page_store.open_store(root, args.flora_id)
+    pages = store.pages('treatment')
+    pages = islice(pages, args.limit) if args.limit else pages
+    texts = [read_page(p.read_text(), 'lxml') for p in pages]
+    store.close()
+    return [t for t in texts if t]
+
+
+def parse_args():
+    """Process command-line arguments."""
+    description = """Time the full and minimal spaCy pipeline profiles over
+        the treatments in a downloaded family directory and check that they
+        find the same traits."""
+    arg_parser = argparse.ArgumentParser(
+        description=textwrap.dedent(description),
+        fromfile_prefix_chars='@')
+
+    arg_parser.add_argument(
+        '--family', '-f', required=True,
+        help="""Which family directory to read, e.g. Asteraceae.""")
+
+    arg_parser.add_argument(
+        '--flora-id', '-e', type=int, default=1,
+        help="""Which flora ID to read. Default 1.""")
+
+    arg_parser.add_argument(
+        '--limit', type=int,
+        help="""Only parse this many treatments.""")
+
+    arg_parser.add_argument(
+        '--batch-size', type=int, default=100,
+        help="""How many treatments to send through the pipeline at a time.
+            (default: %(default)s)""")
+
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    main(ARGS)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Compare the speed of the treatment page reader backends."""
+
+import argparse
+import sys
+import textwrap
+import time
+from itertools import islice
+
+import downloader
+from efloras.pylib import page_store
+from efloras.readers.efloras import BACKENDS, read_page
+
+
+def main(args):
+    """Time each backend over the same treatment pages."""
+    root = downloader.family_dir(args.flora_id, args.family)
+    store = page_store.open_store(root, args.flora_id)
+    paths = store.pages('treatment')
+    paths = list(islice(paths, args.limit)) if args.limit else paths
+
+    if not paths:
+        sys.exit(f'No treatment pages in {root}')
+
+    pages = [p.read_text() for p in paths]
+    store.close()
+
+    texts = {}
+    times = {}
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        texts[backend] = [read_page(p, backend) for p in pages]
+        times[backend] = time.perf_counter() - start
+
+    baseline = times['bs4']
+    template = '{:<8} {:>10} {:>12} {:>8}'
+    print(template.format('Backend', 'Seconds', 'Pages/sec', 'Speedup'))
+    for backend, elapsed in times.items():
+        print(template.format(
+            backend,
+            f'{elapsed:.3f}',
+            f'{len(paths) / elapsed:.1f}',
+            f'{baseline / elapsed:.2f}x'))
+
+    diffs = [p.name for p, a, b in zip(paths, texts['bs4'], texts['lxml'])
+             if a != b]
+    if diffs:
+        print(f'{len(diffs)} pages have different text:', ', '.join(diffs[:10]))
+        sys.exit(1)
+
+
+def parse_args():
+    """Process command-line arguments."""
+    description = """Time the BeautifulSoup and lxml treatment page readers
+        over a downloaded family directory and check that they find the same
+        trait paragraphs."""
+    arg_parser = argparse.ArgumentParser(
+        description=textwrap.dedent(description),
+        fromfile_prefix_chars='@')
+
+    arg_parser.add_argument(
+        '--family', '-f', required=True,
+        help="""Which family directory to read, e.g. Asteraceae.""")
+
+    arg_parser.add_argument(
+        '--flora-id', '-e', type=int, default=1,
+        help="""Which flora ID to read. Default 1.""")
+
+    arg_parser.add_argument(
+        '--limit', type=int,
+        help="""Only read this many treatment pages.""")
+
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    main(ARGS)
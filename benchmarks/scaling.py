@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Time the reader and writer stages on synthetic data of growing size.
+
+Rows and traits are generated with the same shapes the patterns emit: a
+trait paragraph with parts, sizes, colors, shapes, and counts, each trait
+linked to its part. Each stage is timed at every size and the growth in
+time from one size to the next is reported as a scaling exponent, where 1
+is linear and 2 is quadratic.
+
+The reader stages only time read_page on a small page built around each
+synthetic paragraph. They do not time efloras_reader, so walking the family
+tree, the page store, and the family index are left out.
+"""
+
+import argparse
+import json
+import math
+import random
+import sqlite3
+import sys
+import textwrap
+import time
+
+from efloras.readers.efloras import read_page
+from efloras.writers.csv_ import build_columns
+from efloras.writers.html_ import build_classes, format_text
+from efloras.writers.sqlite3_db import create_tables, get_raw_traits, get_traits
+
+PARTS = """ leaf petal sepal stem fruit seed flower bract stamen capsule """.split()
+COLORS = """ green purple white yellow red-brown pale-green """.split()
+SHAPES = """ ovate lanceolate obovate linear elliptic cordate """.split()
+UNITS = """ mm cm dm """.split()
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def main(args):
+    """Time every stage at every size."""
+    results = []
+    for size in args.sizes:
+        rows = synthetic_rows(size, args.seed)
+        for stage, func in STAGES.items():
+            if args.stage and stage not in args.stage:
+                continue
+            if stage.startswith('reader') and size > args.max_pages:
+                continue
+            prepared = PREPARE.get(stage, lambda r: r)(rows)
+            start = time.perf_counter()
+            func(prepared)
+            elapsed = time.perf_counter() - start
+            results.append({
+                'stage': stage,
+                'rows': size,
+                'seconds': round(elapsed, 6),
+                'rows_per_sec': round(size / elapsed, 1) if elapsed else 0.0,
+            })
+            print(f'{stage:<28} {size:>10,} {elapsed:>10.3f}s', file=sys.stderr)
+        del rows
+
+    add_exponents(results)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            json.dump(results, out_file, indent=2)
+
+
+def synthetic_rows(count, seed=0):
+    """Build rows that look like the parsed rows the writers get."""
+    rng = random.Random(seed)
+    return [synthetic_row(i, rng) for i in range(1, count + 1)]
+
+
+def synthetic_row(taxon_id, rng):
+    """Build one parsed treatment."""
+    text = ''
+    ents = []
+
+    def add(fragment, data):
+        nonlocal text
+        start = len(text)
+        text += fragment
+        ents.append(data | {'start': start, 'end': len(text)})
+        return len(ents) - 1
+
+    links = {}
+    for part in rng.sample(PARTS, rng.randint(3, 8)):
+        part_index = add(part, {'trait': 'part', 'part': part})
+        text += ' '
+
+        low = round(rng.uniform(1, 20), 1)
+        high = round(low + rng.uniform(1, 20), 1)
+        units = rng.choice(UNITS)
+        index = add(f'{low}-{high} {units}', {
+            'trait': 'size', 'part': part, 'length_low': low,
+            'length_high': high, 'length_units': units})
+        links[index] = part_index
+        text += ', '
+
+        color = rng.choice(COLORS)
+        index = add(color, {'trait': 'color', 'part': part, 'color': color})
+        links[index] = part_index
+        text += ', '
+
+        shape = rng.choice(SHAPES)
+        index = add(shape, {'trait': 'shape', 'part': part, 'shape': shape})
+        links[index] = part_index
+
+        if rng.random() < 0.5:
+            text += ', '
+            low = rng.randint(1, 12)
+            index = add(str(low), {'trait': 'count', 'part': part, 'low': low})
+            links[index] = part_index
+
+        text += '; '
+
+    ents = [{
+        'start': e['start'],
+        'end': e['end'],
+        'label': e['trait'],
+        'data': e,
+        'links': {'part_link': [links[i]]} if i in links else {},
+    } for i, e in enumerate(ents)]
+
+    return {
+        'family': 'synthaceae',
+        'flora_id': 1,
+        'flora_name': 'Synthetic Flora',
+        'taxon': f'Genus{taxon_id // 50} species{taxon_id}',
+        'taxon_id': taxon_id,
+        'link': ('http://www.efloras.org/florataxon.aspx'
+                 f'?flora_id=1&taxon_id={taxon_id}'),
+        'path': '',
+        'downloaded': '2021-01-01 00:00:00',
+        'text': text.strip(),
+        'ents': ents,
+        'sents': [[0, len(text.strip())]],
+    }
+
+
+def as_pages(rows):
+    """Wrap each row's paragraph in a treatment page."""
+    return [f"""<html><body><div id="panelTaxonTreatment">
+        <p>{r['taxon']}</p><p>Plants perennial.</p><p>{r['text']}</p>
+        </div></body></html>""" for r in rows]
+
+
+def as_html_views(rows):
+    """Build the views html_writer formats, with their CSS classes."""
+    classes = {'part': 'bold', 'subpart': 'bold-italic'}
+    backgrounds, borders = {}, {}
+    views = []
+    for row in rows:
+        view = {**row, 'traits': [e['data'] for e in row['ents']],
+                'raw_text': row['text']}
+        build_classes(view, classes, backgrounds, borders)
+        views.append(view)
+    return views, classes
+
+
+def as_raw_traits(rows):
+    """Build the raw traits get_traits expects."""
+    return get_raw_traits(rows, memory_db())
+
+
+def memory_db():
+    """Create an empty in-memory database."""
+    cxn = sqlite3.connect(':memory:')
+    create_tables(cxn)
+    return cxn
+
+
+def time_build_columns(rows):
+    """Expand the traits into CSV columns the way csv_writer does."""
+    for row in rows:
+        view = {k: v for k, v in row.items() if k not in ('ents', 'sents')}
+        view['raw_traits'] = [e['data'] for e in row['ents']]
+        build_columns(view)
+
+
+def time_format_text(views_classes):
+    """Colorize the text the way html_writer does."""
+    views, classes = views_classes
+    for view in views:
+        format_text(view, classes)
+
+
+STAGES = {
+    'reader.read_page.bs4': lambda pages: [read_page(p, 'bs4') for p in pages],
+    'reader.read_page.lxml': lambda pages: [
+        read_page(p, 'lxml') for p in pages],
+    'csv_writer.build_columns': time_build_columns,
+    'sqlite3_db.get_raw_traits': lambda rows: get_raw_traits(rows, memory_db()),
+    'sqlite3_db.get_traits': get_traits,
+    'html_writer.format_text': time_format_text,
+}
+
+PREPARE = {
+    'reader.read_page.bs4': as_pages,
+    'reader.read_page.lxml': as_pages,
+    'sqlite3_db.get_traits': as_raw_traits,
+    'html_writer.format_text': as_html_views,
+}
+
+
+def add_exponents(results):
+    """Estimate how each stage's time grows from the previous size.
+
+    The exponent k solves t2 / t1 = (n2 / n1) ** k.
+    """
+    last = {}
+    for result in results:
+        prev = last.get(result['stage'])
+        result['exponent'] = None
+        if prev and prev['seconds'] and result['seconds']:
+            result['exponent'] = round(
+                math.log(result['seconds'] / prev['seconds'])
+                / math.log(result['rows'] / prev['rows']), 2)
+        last[result['stage']] = result
+
+
+def print_results(results):
+    """Show the scaling curves as a table."""
+    if any(r['stage'].startswith('reader') for r in results):
+        print('The reader stages time read_page on synthetic three-paragraph '
+              'pages, not the whole efloras_reader.')
+    template = '{:<28} {:>10} {:>10} {:>12} {:>9}'
+    print(template.format('Stage', 'Rows', 'Seconds', 'Rows/sec', 'Exponent'))
+    for result in sorted(results, key=lambda r: (r['stage'], r['rows'])):
+        exponent = result['exponent']
+        print(template.format(
+            result['stage'],
+            f"{result['rows']:,}",
+            f"{result['seconds']:.3f}",
+            f"{result['rows_per_sec']:.0f}",
+            '' if exponent is None else f'{exponent:.2f}'))
+
+
+def parse_args():
+    """Process command-line arguments."""
+    description = """Time the reader and writer stages on synthetic treatments
+        at several sizes to see how each one scales."""
+    arg_parser = argparse.ArgumentParser(
+        description=textwrap.dedent(description),
+        fromfile_prefix_chars='@')
+
+    arg_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=SIZES,
+        help="""How many treatments to generate for each run. Use
+            --sizes 1000 10000 100000 1000000 for the full curve, which needs
+            several gigabytes of memory. (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--stage', action='append', choices=list(STAGES),
+        help="""Only time this stage. Use it once for each stage.
+            Default is every stage.""")
+
+    arg_parser.add_argument(
+        '--max-pages', type=int, default=100_000,
+        help="""Skip the HTML reader stages for sizes bigger than this, since
+            they are much slower than the others. (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--seed', type=int, default=0,
+        help="""Seed for generating the synthetic data. (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--output', '-o',
+        help="""Write the results to this JSON file.""")
+
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    main(ARGS)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Measure trait pipeline throughput over a frozen corpus of treatments.
+
+The results are written as JSON so runs can be compared. Given an earlier
+result, this exits with an error when throughput drops by more than the
+tolerance.
+"""
+
+import argparse
+import hashlib
+import importlib
+import json
+import platform
+import resource
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import spacy
+from spacy.matcher import DependencyMatcher, Matcher
+
+import downloader
+import efloras.patterns
+from efloras.pylib import family_index, pipe_timer
+from efloras.pylib import pipeline as pipeline_
+from efloras.readers.efloras import index_version
+
+CORPUS = Path(__file__).resolve().parent / 'data' / 'corpus.jsonl'
+
+
+def main(args):
+    """Freeze a corpus or benchmark the pipeline over one."""
+    if args.freeze:
+        freeze(args)
+        return
+
+    if not args.corpus.exists():
+        sys.exit(f'{args.corpus} not found. Build it from downloaded and '
+                 'extracted families with --freeze.')
+
+    corpus = read_corpus(args.corpus)
+    texts = [c['text'] for c in corpus]
+
+    start = time.perf_counter()
+    nlp = pipeline_.pipeline(profile=args.pipeline)
+    load_seconds = time.perf_counter() - start
+
+    # Time the whole pipeline and keep the fastest run
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        docs = list(nlp.pipe(texts, batch_size=args.batch_size))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tokens = sum(len(d) for d in docs)
+
+    # Time each component in a separate pass
+    timings = {}
+    pipe_timer.pipe(nlp, texts, timings, batch_size=args.batch_size)
+    modules = pattern_modules()
+    components = pipe_timer.summary(timings)
+    for component in components:
+        names = {owner for owner, _ in modules.get(component['component'], [])}
+        component['pattern_modules'] = sorted(names)
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'spacy': spacy.__version__,
+        'pipeline': args.pipeline,
+        'batch_size': args.batch_size,
+        'repeat': args.repeat,
+        'corpus': {
+            'path': str(args.corpus),
+            'sha256': hashlib.sha256(args.corpus.read_bytes()).hexdigest(),
+            'docs': len(texts),
+            'tokens': tokens,
+        },
+        'load_seconds': round(load_seconds, 6),
+        'seconds': round(best, 6),
+        'docs_per_sec': round(len(texts) / best, 1),
+        'tokens_per_sec': round(tokens / best, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'components': components,
+        'patterns': time_patterns(nlp, texts, modules, args.batch_size),
+    }
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            json.dump(results, out_file, indent=2)
+
+    if args.compare and not compare(args.compare, results, args.tolerance):
+        sys.exit(1)
+
+
+def read_corpus(path):
+    """Read the frozen treatments."""
+    with open(path) as in_file:
+        return [json.loads(ln) for ln in in_file if ln.strip()]
+
+
+def freeze(args):
+    """Sample trait paragraphs from downloaded families into a corpus.
+
+    Each family contributes up to a fixed number of treatments spread
+    evenly over its taxon IDs, so freezing the same data twice gives the
+    same corpus.
+    """
+    corpus = []
+    for family in args.family:
+        dir_ = downloader.family_dir(args.flora_id, family)
+        if not dir_.exists():
+            sys.exit(f'{dir_} not found. Download {family} for flora '
+                     f'{args.flora_id} first.')
+        if not (dir_ / family_index.INDEX_NAME).exists():
+            sys.exit(f'{family} has no treatment index. Run extract.py on it '
+                     'first.')
+        cxn = family_index.connect(dir_, index_version())
+        rows = cxn.execute(
+            "SELECT taxon_id, text FROM treatments WHERE text <> '' "
+            'ORDER BY taxon_id;').fetchall()
+        cxn.close()
+
+        step = max(1, len(rows) // args.per_family)
+        for taxon_id, text in rows[::step][:args.per_family]:
+            corpus.append({
+                'family': family,
+                'flora_id': args.flora_id,
+                'taxon_id': taxon_id,
+                'source': dir_.name,
+                'text': text,
+            })
+
+    if not corpus:
+        sys.exit('No indexed treatments found. Run extract.py on the families.')
+
+    args.corpus.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.corpus, 'a' if args.append else 'w') as out_file:
+        out_file.writelines(json.dumps(c) + '\n' for c in corpus)
+    print(f'{len(corpus)} treatments written to {args.corpus}')
+
+
+def pattern_modules():
+    """Find which pattern modules feed each pipeline component.
+
+    This returns, for each component, the (module name, patterns) pairs it
+    was built with.
+    """
+    owners = {}
+    for path in sorted(Path(efloras.patterns.__file__).parent.glob('*.py')):
+        if path.stem == '__init__':
+            continue
+        module = importlib.import_module(f'efloras.patterns.{path.stem}')
+        for value in vars(module).values():
+            owners.setdefault(id(value), path.stem)
+
+    feeds = {
+        'term_ruler': pipeline_.TERM_RULES,
+        'update_entities': pipeline_.UPDATE_DATA,
+        'match_ruler': pipeline_.ADD_DATA,
+        'part_linker': pipeline_.LINKERS,
+    }
+    return {c: [(owners[id(p)], p) for p in patterns if id(p) in owners]
+            for c, patterns in feeds.items()}
+
+
+def time_patterns(nlp, texts, modules, batch_size):
+    """Time each pattern module's patterns on their own.
+
+    The docs are parsed up to the component a module feeds and then only
+    that module's patterns are matched against them, so each module's cost
+    is measured apart from the rest of its component.
+    """
+    results = []
+    for component, owned in modules.items():
+        later = nlp.pipe_names[nlp.pipe_names.index(component):]
+        docs = list(nlp.pipe(texts, batch_size=batch_size, disable=later))
+
+        by_module = {}
+        for owner, patterns in owned:
+            by_module.setdefault(owner, []).append(patterns)
+
+        for owner, patterns in by_module.items():
+            if component == 'part_linker':
+                matcher = DependencyMatcher(nlp.vocab)
+            else:
+                matcher = Matcher(nlp.vocab)
+            for pattern in patterns:
+                matcher.add(pattern.label, pattern.patterns)
+
+            start = time.perf_counter()
+            for doc in docs:
+                matcher(doc)
+            results.append({
+                'module': owner,
+                'component': component,
+                'seconds': round(time.perf_counter() - start, 6),
+            })
+
+    total = sum(r['seconds'] for r in results) or 1.0
+    for result in results:
+        result['share'] = round(result['seconds'] / total, 4)
+    return sorted(results, key=lambda r: r['seconds'], reverse=True)
+
+
+def peak_rss_mb():
+    """Get the peak resident memory of this process in megabytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def git_commit():
+    """Get the current commit, if there is one."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def print_results(results):
+    """Show the results as a table."""
+    print(f"{results['corpus']['docs']} docs, "
+          f"{results['corpus']['tokens']} tokens, "
+          f"{results['docs_per_sec']} docs/sec, "
+          f"{results['tokens_per_sec']} tokens/sec, "
+          f"peak RSS {results['peak_rss_mb']} MB")
+
+    template = '{:<20} {:>10} {:>7} {:>12}  {}'
+    print(template.format(
+        'Component', 'Seconds', 'Share', 'Tokens/sec', 'Pattern modules'))
+    for row in results['components']:
+        print(template.format(
+            row['component'],
+            f"{row['seconds']:.3f}",
+            f"{row['share']:.1%}",
+            f"{row['tokens_per_sec']:.0f}",
+            ', '.join(row['pattern_modules'])))
+
+    template = '{:<20} {:<20} {:>10} {:>7}'
+    print()
+    print(template.format('Pattern module', 'Component', 'Seconds', 'Share'))
+    for row in results['patterns']:
+        print(template.format(
+            row['module'],
+            row['component'],
+            f"{row['seconds']:.3f}",
+            f"{row['share']:.1%}"))
+
+
+def compare(path, results, tolerance):
+    """Check the throughput against an earlier run."""
+    with open(path) as in_file:
+        old = json.load(in_file)
+
+    if old['corpus']['sha256'] != results['corpus']['sha256']:
+        print('The corpus changed since the earlier run so they cannot be '
+              'compared.')
+        return False
+
+    change = results['docs_per_sec'] / old['docs_per_sec'] - 1.0
+    print(f"docs/sec {old['docs_per_sec']} -> {results['docs_per_sec']} "
+          f'({change:+.1%})')
+
+    if change < -tolerance:
+        print(f'Throughput dropped more than {tolerance:.0%}.')
+        return False
+    return True
+
+
+def parse_args():
+    """Process command-line arguments."""
+    description = """Benchmark the trait pipeline over a frozen corpus of
+        treatment paragraphs. Reports docs/sec, tokens/sec, peak memory, and
+        the time spent in each pipeline component along with the pattern
+        modules that component runs. Use --freeze to build the corpus from
+        families that have already been extracted."""
+    arg_parser = argparse.ArgumentParser(
+        description=textwrap.dedent(description),
+        fromfile_prefix_chars='@')
+
+    arg_parser.add_argument(
+        '--corpus', type=Path, default=CORPUS,
+        help="""The frozen corpus, one JSON treatment per line.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--output', '-o',
+        help="""Write the results to this JSON file.""")
+
+    arg_parser.add_argument(
+        '--compare', '-c',
+        help="""Compare the results with this earlier JSON result and exit
+            with an error if the throughput dropped too much.""")
+
+    arg_parser.add_argument(
+        '--tolerance', type=float, default=0.10,
+        help="""How much of a drop in docs/sec to allow when comparing.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--pipeline', choices=list(pipeline_.PROFILES),
+        default=pipeline_.DEFAULT_PROFILE,
+        help="""Which pipeline profile to benchmark. (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--batch-size', type=int, default=100,
+        help="""How many treatments to send through the pipeline at a time.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--repeat', type=int, default=3,
+        help="""Time the corpus this many times and keep the fastest.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--freeze', action='store_true',
+        help="""Build the corpus from the indexed treatments of the families
+            instead of running the benchmark.""")
+
+    arg_parser.add_argument(
+        '--family', '-f', action='append', default=[],
+        help="""A family directory to sample when freezing, e.g. Pinaceae.
+            Use it once for each family.""")
+
+    arg_parser.add_argument(
+        '--flora-id', '-e', type=int, default=1,
+        help="""Which flora ID the families are from. Default 1.""")
+
+    arg_parser.add_argument(
+        '--per-family', type=int, default=50,
+        help="""How many treatments to take from each family when freezing.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--append', action='store_true',
+        help="""Add to the corpus when freezing instead of replacing it, so
+            families from several floras can be combined.""")
+
+    args = arg_parser.parse_args()
+
+    if args.freeze and not args.family:
+        sys.exit('--freeze needs at least one --family.')
+
+    if args.repeat < 1 or args.batch_size < 1:
+        sys.exit('--repeat and --batch-size must be positive integers.')
+
+    return args
+
+
+if __name__ == '__main__':
+    ARGS = parse_args()
+    main(ARGS)
@@ -4,14 +4,9 @@
 
 import argparse
 import os
-import random
 import re
-import socket
 import sys
 import textwrap
-import time
-import urllib.request
-from urllib.error import HTTPError
 
 import pandas as pd
 import regex
@@ -20,20 +15,28 @@ from lxml import html
 
 import efloras.pylib.const
 import efloras.pylib.util
+from efloras.pylib import frontier, manifest, page_store
 from efloras.pylib.const import DATA_DIR, SITE
+from efloras.pylib.fetcher import Fetcher, file_validators
 
-# Don't hit the site too hard
-SLEEP_MID = 15
-SLEEP_RADIUS = 5
-SLEEP_RANGE = (SLEEP_MID - SLEEP_RADIUS, SLEEP_MID + SLEEP_RADIUS)
+# Don't hit the site too hard: one request every 15 seconds on average,
+# like the old 10 to 20 second pause between pages
+RATE = 1 / 15  # Requests per second across all threads
+PER_HOST = 2  # Simultaneous requests to one host
+WORKERS = 4  # Download threads
 
 # Make a few attempts to download a page
-ERROR_SLEEP = 120
 ERROR_RETRY = 10
+MAX_BACKOFF = 300.0
+
+# How many pages to take from the crawl frontier at a time
+CRAWL_BATCH = 100
+
+# The taxon IDs of treatments that changed in the last refresh
+CHANGED_TAXA = 'changed_taxa.txt'
 
 # Set a timeout for requests
 TIMEOUT = 30
-socket.setdefaulttimeout(TIMEOUT)
 
 FAMILY_DIR = DATA_DIR / 'efloras_families'
 
@@ -52,28 +55,57 @@ def main(args, families, efloras_ids):
         sys.exit()
 
     if args.update_families:
-        update_families()
+        with get_fetcher(args) as fetcher:
+            update_families(fetcher)
         sys.exit()
 
+    if args.rebuild_manifest:
+        cxn = manifest.connect()
+        manifest.rebuild(cxn)
+        cxn.close()
+        sys.exit()
+
+    with get_fetcher(args) as fetcher:
+        download_families_pages(args, fetcher)
+
+
+def get_fetcher(args):
+    """Build the page fetcher from the arguments."""
+    return Fetcher(
+        rate=args.rate, per_host=args.per_host, workers=args.workers,
+        retries=args.retries, max_backoff=MAX_BACKOFF, timeout=TIMEOUT)
+
+
+def download_families_pages(args, fetcher):
+    """Download the tree and treatment pages of every family asked for."""
     for family in args.family:
         key = (family, args.flora_id)
         family_name = FAMILIES[key]['family']
         taxon_id = FAMILIES[key]['taxon_id']
 
-        dir_ = tree_dir(args.flora_id, family_name)
+        dir_ = family_dir(args.flora_id, family_name)
         os.makedirs(dir_, exist_ok=True)
 
-        dir_ = treatment_dir(args.flora_id, family_name)
-        os.makedirs(dir_, exist_ok=True)
+        store = page_store.open_store(dir_, args.flora_id, args.store)
+        store.create()
 
-        download(family_name, args.flora_id, taxon_id)
+        download(
+            fetcher, store, family_name, args.flora_id, taxon_id,
+            resume=args.resume, refresh=args.refresh)
 
+        store.close()
 
-def update_families():
+        cxn = manifest.connect()
+        with cxn:
+            manifest.update(cxn, dir_, family_name, args.flora_id)
+        cxn.close()
+
+
+def update_families(fetcher):
     """Update the list of families for each flora ID."""
-    floras = download_floras()
+    floras = download_floras(fetcher)
     for flora_id in floras:
-        download_families(flora_id)
+        download_families(fetcher, flora_id)
 
     pattern = 'flora_id=*_page=*'
     families = []
@@ -101,11 +133,11 @@ def update_families():
     df.to_csv(efloras.pylib.const.EFLORAS_FAMILIES, index=None)
 
 
-def download_families(flora_id):
+def download_families(fetcher, flora_id):
     """Get the families for the flora."""
     base_url = f'{SITE}/browse.aspx?flora_id={flora_id}'
     path = FAMILY_DIR / f'flora_id={flora_id}_page=1.html'
-    urllib.request.urlretrieve(base_url, path)
+    fetcher.save(base_url, path)
 
     with open(path) as in_file:
         page = in_file.read()
@@ -123,14 +155,14 @@ def download_families(flora_id):
     for page in pages:
         url = base_url + f'&page={page}'
         path = FAMILY_DIR / f'flora_id={flora_id}_page={page}.html'
-        urllib.request.urlretrieve(url, path)
+        fetcher.save(url, path)
 
 
-def download_floras():
+def download_floras(fetcher):
     """Get the floras from the main page."""
     url = SITE
     path = FAMILY_DIR / 'home_page.html'
-    urllib.request.urlretrieve(url, path)
+    fetcher.save(url, path)
 
     with open(path) as in_file:
         page = in_file.read()
@@ -147,111 +179,142 @@ def download_floras():
     return floras
 
 
-def download(family_name, flora_id, taxon_id):
-    """Download the family tree and then treatments."""
-    family_tree(family_name, flora_id, taxon_id, set())
-
-    tree_dir_ = tree_dir(flora_id, family_name)
-    for path in tree_dir_.glob('*.html'):
-        with open(path) as in_file:
-            page = html.fromstring(in_file.read())
-        get_treatments(flora_id, family_name, page)
-
-
-def get_treatments(flora_id, family_name, page):
-    """Get the treatment files in the tree."""
-    treatment = regex.compile(
-        r'.*florataxon\.aspx\?flora_id=\d+&taxon_id=(?P<taxon_id>\d+)',
-        regex.VERBOSE | regex.IGNORECASE)
-
-    for anchor in page.iterlinks():
-        link = anchor[2]
-        if match := treatment.match(link):
-            taxon_id = match.group('taxon_id')
-            get_treatment(flora_id, family_name, taxon_id)
-
-
-def get_treatment(flora_id, family_name, taxon_id):
-    """Get one treatment file in the tree."""
-    path = treatment_file(flora_id, family_name, taxon_id)
-    url = (f'{SITE}/florataxon.aspx'
-           f'?flora_id={flora_id}'
-           f'&taxon_id={taxon_id}')
-
-    print(f'Treatment: {url}')
-
-    download_page(url, path)
-
-
-def family_tree(family_name, flora_id, taxon_id, parents):
-    """Get to the pages via the family links."""
-    page_link = regex.compile(
+def download(
+        fetcher, store, family_name, flora_id, taxon_id, resume=False, refresh=False):
+    """Crawl the family tree and then download the treatments.
+
+    The crawl is driven by a persistent frontier. With resume, the crawl
+    continues from the pages left pending by an earlier run and trusts the
+    frontier instead of checking which files already exist. With refresh,
+    pages we already have are requested again conditionally and only
+    rewritten when they changed.
+    """
+    dir_ = family_dir(flora_id, family_name)
+    cxn = frontier.connect(dir_)
+
+    if resume:
+        frontier.retry_failed(cxn)
+    else:
+        frontier.reset(cxn)
+
+    with cxn:
+        frontier.add(cxn, [tree_item(flora_id, taxon_id)])
+
+    check_files = not (resume or refresh)
+    crawl(fetcher, cxn, store, flora_id, 'tree', check_files, refresh)
+    crawl(fetcher, cxn, store, flora_id, 'treatment', check_files, refresh)
+
+    for (kind, status), count in sorted(frontier.counts(cxn).items()):
+        print(f'{kind:<10} {status:<8} {count:>8}')
+
+    if refresh:
+        report_changes(cxn, dir_)
+
+    cxn.close()
+
+
+def crawl(
+        fetcher, cxn, store, flora_id, kind, check_files=True, refresh=False):
+    """Drain the frontier of one kind of page, a batch at a time.
+
+    Tree pages are parsed as they arrive and the pages they link to are
+    queued. Everything about a page is saved in one transaction so a killed
+    crawl never loses track of a page.
+    """
+    while batch := frontier.pending(cxn, kind, CRAWL_BATCH):
+        paths = [store.page(kind, p['taxon_id'], p['page_no']) for p in batch]
+
+        if refresh:
+            validators = frontier.get_validators(cxn, [p['url'] for p in batch])
+            jobs = [(p['url'], path,
+                     validators.get(p['url']) or file_validators(path))
+                    for p, path in zip(batch, paths)]
+        else:
+            jobs = [(p['url'], path) for p, path in zip(batch, paths)
+                    if not (check_files and path.exists())]
+
+        for page in batch:
+            print(f'{kind.capitalize()}: {page["url"]}')
+
+        saved, failures = fetcher.download_all(jobs)
+        failed = {u for u, _ in failures}
+        for _, error in failures:
+            print(f'Failed: {error}')
+
+        changed = {s.url for s in saved if s.changed}
+
+        with cxn:
+            for page, path in zip(batch, paths):
+                if page['url'] in failed:
+                    continue
+                if kind == 'tree':
+                    frontier.add(cxn, tree_links(flora_id, path))
+            frontier.put_validators(cxn, saved)
+            if refresh:
+                frontier.add_changes(
+                    cxn, [p for p in batch if p['url'] in changed])
+            frontier.mark(cxn, failed, frontier.FAILED)
+            frontier.mark(
+                cxn, [p['url'] for p in batch if p['url'] not in failed],
+                frontier.DONE)
+
+
+def report_changes(cxn, dir_):
+    """List the treatments that changed in a refresh.
+
+    They are also written to a file so a later extraction can be limited
+    to them.
+    """
+    taxon_ids = frontier.changed_taxon_ids(cxn)
+    path = dir_ / CHANGED_TAXA
+    with open(path, 'w') as out_file:
+        out_file.writelines(f'{i}\n' for i in taxon_ids)
+    print(f'{len(taxon_ids)} treatments changed, listed in {path}')
+
+
+def tree_links(flora_id, path):
+    """Find the tree & treatment pages linked from a stored tree page."""
+    tree_link = regex.compile(
         (r'browse\.aspx\?flora_id=\d+'
          r'&start_taxon_id=(?P<taxon_id>\d+)'
-         r'&page=(?P<page>\d+)'),
+         r'(&page=(?P<page>\d+))?'),
         regex.VERBOSE | regex.IGNORECASE)
 
-    parents.add(taxon_id)
+    treatment_link = regex.compile(
+        r'florataxon\.aspx\?flora_id=\d+&taxon_id=(?P<taxon_id>\d+)',
+        regex.VERBOSE | regex.IGNORECASE)
 
-    page = tree_page(family_name, flora_id, taxon_id, parents)
+    page = html.fromstring(path.read_text())
 
+    links = []
     for anchor in page.xpath('//a'):
         href = anchor.attrib.get('href', '')
-        match = page_link.search(href)
-        if match:
-            page_no = int(match.group('page'))
-            name = f'{taxon_id}_{page_no}'
-            if name not in parents:
-                parents.add(name)
-                tree_page(
-                    family_name, flora_id, taxon_id, parents, page_no=page_no)
-
-
-def tree_page(family_name, flora_id, taxon_id, parents, page_no=1):
-    """Get a family tree page."""
-    lower_link = regex.compile(
-        r'browse\.aspx\?flora_id=\d+&start_taxon_id=(?P<taxon_id>\d+)',
-        regex.VERBOSE | regex.IGNORECASE)
+        if match := tree_link.search(href):
+            page_no = int(match.group('page') or 1)
+            links.append(tree_item(flora_id, match.group('taxon_id'), page_no))
+        elif match := treatment_link.search(href):
+            links.append(treatment_item(flora_id, match.group('taxon_id')))
+    return links
 
-    path = tree_file(flora_id, family_name, taxon_id, page_no)
 
+def tree_item(flora_id, taxon_id, page_no=1):
+    """Build a frontier entry for a family tree page."""
     url = (f'{SITE}/browse.aspx'
            f'?flora_id={flora_id}'
            f'&start_taxon_id={taxon_id}')
     if page_no > 1:
         url += f'&page={page_no}'
-
-    print(f'Tree: {url}')
-
-    download_page(url, path)
-
-    with open(path) as in_file:
-        page = html.fromstring(in_file.read())
-
-    for link in page.xpath('//a'):
-        href = link.attrib.get('href', '')
-        match = lower_link.search(href)
-        if match and match.group('taxon_id') not in parents:
-            family_tree(
-                family_name, flora_id, match.group('taxon_id'), parents)
-
-    return page
+    return {'url': url, 'kind': 'tree', 'taxon_id': int(taxon_id),
+            'page_no': page_no}
 
 
-def download_page(url, path):
-    """Download a page if it does not exist."""
-    if path.exists():
-        return
-
-    for attempt in range(ERROR_RETRY):
-        if attempt > 0:
-            print(f'Attempt {attempt + 1}')
-        try:
-            urllib.request.urlretrieve(url, path)
-            time.sleep(random.randint(SLEEP_RANGE[0], SLEEP_RANGE[1]))
-            break
-        except (TimeoutError, socket.timeout, HTTPError):
-            pass
+def treatment_item(flora_id, taxon_id):
+    """Build a frontier entry for a treatment page."""
+    url = (f'{SITE}/florataxon.aspx'
+           f'?flora_id={flora_id}'
+           f'&taxon_id={taxon_id}')
+    return {'url': url, 'kind': 'treatment', 'taxon_id': int(taxon_id),
+            'page_no': 1}
 
 
 def print_flora_ids(flora_ids):
@@ -307,42 +370,12 @@ def get_flora_id(href):
     return int(flora_id_re.search(href)[1])
 
 
-def treatment_file(flora_id, family_name, taxon_id, page_no=1):
-    """Build the treatment directory name."""
-    root = treatment_dir(flora_id, family_name)
-    return root / taxon_file(taxon_id, page_no)
-
-
-def tree_file(flora_id, family_name, taxon_id, page_no=1):
-    """Build the family tree directory name."""
-    root = tree_dir(flora_id, family_name)
-    return root / taxon_file(taxon_id, page_no)
-
-
 def family_dir(flora_id, family_name):
     """Build the family directory name."""
     taxon_dir = f'{family_name}_{flora_id}'
     return DATA_DIR / 'eFloras' / taxon_dir
 
 
-def taxon_file(taxon_id, page_no=1):
-    """Build the taxon file name."""
-    file_name = f'taxon_id_{taxon_id}.html'
-    if page_no > 1:
-        file_name = f'taxon_id_{taxon_id}_{page_no}.html'
-    return file_name
-
-
-def tree_dir(flora_id, family_name):
-    """Build the family tree directory name."""
-    return family_dir(flora_id, family_name) / 'tree'
-
-
-def treatment_dir(flora_id, family_name):
-    """Build the treatment directory name."""
-    return family_dir(flora_id, family_name) / 'treatments'
-
-
 def parse_args(flora_ids):
     """Process command-line arguments."""
     description = """Download data from the eFloras website."""
@@ -367,6 +400,54 @@ def parse_args(flora_ids):
         '--list-flora-ids', '-l', action='store_true',
         help="""List flora IDs and exit.""")
 
+    arg_parser.add_argument(
+        '--rebuild-manifest', action='store_true',
+        help="""Recount the downloaded pages of every family and exit. Use
+            this after adding or removing family directories by hand.""")
+
+    arg_parser.add_argument(
+        '--resume', action='store_true',
+        help="""Continue a crawl that was stopped, starting with the pages
+            that were still waiting to be downloaded.""")
+
+    arg_parser.add_argument(
+        '--refresh', action='store_true',
+        help="""Check every page we already have for changes. Pages are
+            requested conditionally and only rewritten when they changed.
+            The changed treatments are listed in the family directory in
+            changed_taxa.txt.""")
+
+    arg_parser.add_argument(
+        '--store', choices=page_store.BACKENDS,
+        help="""How to keep the downloaded pages. "files" saves each page as
+            its own HTML file. "archive" saves compressed pages in one SQLite
+            file per family, storing identical pages once. The reader finds
+            either one. By default a family keeps the store it already has,
+            and new families get files.""")
+
+    arg_parser.add_argument(
+        '--rate', type=float, default=RATE,
+        help="""Maximum requests per second to the site across all download
+            threads. The default is one request every 15 seconds, the same
+            pace as the old pause between pages. Go faster only if the site
+            allows it. (default: %(default).3f)""")
+
+    arg_parser.add_argument(
+        '--per-host', type=int, default=PER_HOST,
+        help="""Maximum simultaneous requests to one host.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--workers', type=int, default=WORKERS,
+        help="""How many threads download treatment pages.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--retries', type=int, default=ERROR_RETRY,
+        help="""How many times to try a page before giving up. Each retry
+            waits about twice as long as the one before it.
+            (default: %(default)s)""")
+
     arg_parser.add_argument(
         '--search', '-s',
         help="""Search the families list for one that matches the string.
@@ -375,6 +456,15 @@ def parse_args(flora_ids):
 
     args = arg_parser.parse_args()
 
+    if args.rate <= 0:
+        sys.exit('--rate must be greater than zero.')
+
+    if args.retries < 1:
+        sys.exit('--retries must be at least 1.')
+
+    if args.per_host < 1 or args.workers < 1:
+        sys.exit('--per-host and --workers must be at least 1.')
+
     if args.family:
         args.family = [x.lower() for x in args.family]
         for family in args.family:
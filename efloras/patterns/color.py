@@ -6,7 +6,8 @@ from spacy import registry
 from traiter.const import DASH, DASH_CHAR
 from traiter.patterns.matcher_patterns import MatcherPatterns
 
-from efloras.pylib.const import COMMON_PATTERNS, MISSING, REMOVE, REPLACE
+import efloras.pylib.const as const
+from efloras.pylib.const import COMMON_PATTERNS, MISSING
 
 MULTIPLE_DASHES = ['\\' + c for c in DASH_CHAR]
 MULTIPLE_DASHES = fr'\s*[{"".join(MULTIPLE_DASHES)}]{{2,}}\s*'
@@ -30,10 +31,10 @@ COLOR = MatcherPatterns(
 def color(ent):
     """Enrich a phrase match."""
     parts = {r: 1 for t in ent
-             if (r := REPLACE.get(t.lower_, t.lower_)) not in SKIP
-             and not REMOVE.get(t.lower_)}
+             if (r := const.REPLACE.get(t.lower_, t.lower_)) not in SKIP
+             and not const.REMOVE.get(t.lower_)}
     value = '-'.join(parts.keys())
     value = re.sub(MULTIPLE_DASHES, r'-', value)
-    ent._.data['color'] = REPLACE.get(value, value)
+    ent._.data['color'] = const.REPLACE.get(value, value)
     if any(t for t in ent if t.lower_ in MISSING):
         ent._.data['missing'] = True
@@ -8,7 +8,8 @@ from traiter.const import CROSS, FLOAT_RE, INT_TOKEN_RE, SLASH
 from traiter.patterns.matcher_patterns import MatcherPatterns
 from traiter.util import to_positive_int
 
-from efloras.pylib.const import COMMON_PATTERNS, REPLACE
+import efloras.pylib.const as const
+from efloras.pylib.const import COMMON_PATTERNS
 
 NOT_COUNT_WORDS = CROSS + SLASH + """ average side times days weeks by """.split()
 NOT_COUNT_ENTS = """ imperial_length metric_mass imperial_mass """.split()
@@ -64,7 +65,7 @@ def count(ent):
         pc = pc[0]
         pc_text = pc.text.lower()
         pc._.new_label = 'count_group'
-        range_._.data['count_group'] = REPLACE.get(pc_text, pc_text)
+        range_._.data['count_group'] = const.REPLACE.get(pc_text, pc_text)
         range_._.links['count_group_link'] = [(pc.start_char, pc.end_char)]
 
 
@@ -73,7 +74,7 @@ def count_word(ent):
     """Enrich the match with data."""
     ent._.new_label = 'count'
     word = [e for e in ent.ents if e.label_ == 'count_word'][0]
-    word._.data = {'low': to_positive_int(REPLACE[word.text])}
+    word._.data = {'low': to_positive_int(const.REPLACE[word.text])}
     word._.new_label = 'count'
 
 
@@ -6,7 +6,8 @@ from spacy import registry
 from traiter.const import DASH
 from traiter.patterns.matcher_patterns import MatcherPatterns
 
-from efloras.pylib.const import COMMON_PATTERNS, REPLACE
+import efloras.pylib.const as const
+from efloras.pylib.const import COMMON_PATTERNS
 
 TEMP = ['\\' + c for c in DASH[:2]]
 MULTIPLE_DASHES = fr'[{"".join(TEMP)}]{{2,}}'
@@ -37,8 +38,8 @@ MARGIN_SHAPE = MatcherPatterns(
 def margin(ent):
     """Enrich a phrase match."""
     value = {r: 1 for t in ent
-             if (r := REPLACE.get(t.text, t.text))
+             if (r := const.REPLACE.get(t.text, t.text))
              and t._.cached_label in SHAPES}
     value = '-'.join(value.keys())
     value = re.sub(rf'\s*{MULTIPLE_DASHES}\s*', r'-', value)
-    ent._.data['margin_shape'] = REPLACE.get(value, value)
+    ent._.data['margin_shape'] = const.REPLACE.get(value, value)
@@ -6,7 +6,8 @@ from spacy import registry
 from traiter.const import DASH
 from traiter.patterns.matcher_patterns import MatcherPatterns
 
-from efloras.pylib.const import COMMON_PATTERNS, REPLACE
+import efloras.pylib.const as const
+from efloras.pylib.const import COMMON_PATTERNS
 
 TEMP = ['\\' + c for c in DASH[:2]]
 MULTIPLE_DASHES = fr'[{"".join(TEMP)}]{{2,}}'
@@ -45,11 +46,11 @@ N_SHAPE = MatcherPatterns(
 def shape(ent):
     """Enrich a phrase match."""
     parts = {r: 1 for t in ent
-             if (r := REPLACE.get(t.lower_, t.lower_))
+             if (r := const.REPLACE.get(t.lower_, t.lower_))
              and t._.cached_label in {'shape', 'shape_suffix'}}
     value = '-'.join(parts.keys())
     value = re.sub(rf'\s*{MULTIPLE_DASHES}\s*', r'-', value)
-    ent._.data['shape'] = REPLACE.get(value, value)
+    ent._.data['shape'] = const.REPLACE.get(value, value)
     loc = [t.lower_ for t in ent if t._.cached_label == 'location']
     if loc:
         ent._.data['location'] = loc[0]
@@ -9,7 +9,8 @@ from traiter.const import CROSS, FLOAT_RE
 from traiter.patterns.matcher_patterns import MatcherPatterns
 from traiter.util import to_positive_float
 
-from efloras.pylib.const import COMMON_PATTERNS, REPLACE
+import efloras.pylib.const as const
+from efloras.pylib.const import COMMON_PATTERNS
 
 FOLLOW = """ dim sex """.split()
 NOT_A_SIZE = """ for """.split()
@@ -90,7 +91,7 @@ def size_double_dim(ent):
 
     Like: Legumes 2.8-4.5 mm high and wide
     """
-    dims = [REPLACE.get(t.lower_, t.lower_) for t in ent
+    dims = [const.REPLACE.get(t.lower_, t.lower_) for t in ent
             if t._.cached_label == 'dim']
 
     ranges = [e for e in ent.ents if e._.cached_label.split('.')[0] == 'range']
@@ -142,11 +143,11 @@ def scan_tokens(ent, high_only):
                 del dims[-1]['low']
 
         elif label == 'metric_length':
-            dims[-1]['units'] = REPLACE[token.lower_]
+            dims[-1]['units'] = const.REPLACE[token.lower_]
             dims[-1]['units_link'] = token_2_ent[t]
 
         elif label == 'dim':
-            dims[-1]['dimension'] = REPLACE[token.lower_]
+            dims[-1]['dimension'] = const.REPLACE[token.lower_]
             dims[-1]['dimension_link'] = token_2_ent[t]
 
         elif label == 'sex':
@@ -1,18 +1,29 @@
-"""Project-wide constants."""
+"""Project-wide constants.
 
+The terms and the constants built from them take a while to build. They
+are loaded from a compiled artifact the first time they are used and only
+rebuilt when the term CSVs change.
+"""
+
+import os
 import re
+from functools import lru_cache
 from pathlib import Path
 
 from traiter.const import CLOSE, COMMA, DASH, FLOAT_TOKEN_RE, OPEN, PLUS, SLASH
-from traiter.terms.csv_ import Csv
 
 BASE_DIR = Path.cwd().resolve().parts[-1]
 BASE_DIR = Path.cwd() if BASE_DIR.find('floras') > -1 else Path.cwd().parent
 
 DATA_DIR = BASE_DIR / 'data'
 PROCESSED_DATA = DATA_DIR / 'processed'
+PARSE_CACHE = DATA_DIR / 'cache' / 'parse_cache.sqlite'
+PIPELINE_CACHE = DATA_DIR / 'cache' / 'pipeline'
+TERM_CACHE = Path(
+    os.environ.get('EFLORAS_TERM_CACHE', DATA_DIR / 'cache' / 'terms.pickle'))
 
 EFLORAS_DIR = DATA_DIR / 'eFloras'
+MANIFEST = EFLORAS_DIR / 'manifest.sqlite'
 EFLORAS_FAMILIES = DATA_DIR / 'efloras_families' / 'eFloras_family_list.csv'
 
 # Download site
@@ -20,19 +31,51 @@ SITE = 'http://www.efloras.org'
 
 # #########################################################################
 # Term related constants
-TERMS = Csv.shared('colors units plant_treatment')
-TERMS += Csv.hyphenate_terms(TERMS)
-TERMS += Csv.trailing_dash(TERMS, label='color')
-TERMS.drop('imperial_length')
+@lru_cache(maxsize=None)
+def term_artifact():
+    """Load the compiled terms, building them if the term CSVs changed."""
+    from efloras.pylib import term_cache  # pylint: disable=import-outside-toplevel
+    return term_cache.load(TERM_CACHE, build_terms)
 
-REPLACE = TERMS.pattern_dict('replace')
-REMOVE = TERMS.pattern_dict('remove')
 
-# #########################################################################
-# Used to filter paragraphs in the source documents.
-PARA_RE = [t['pattern'] for t in TERMS.with_label('part')]
-PARA_RE = '|'.join(PARA_RE)
-PARA_RE = re.compile(PARA_RE)
+def build_terms():
+    """Build the terms and everything derived from them."""
+    from traiter.terms.csv_ import Csv  # pylint: disable=import-outside-toplevel
+
+    terms = Csv.shared('colors units plant_treatment')
+    terms += Csv.hyphenate_terms(terms)
+    terms += Csv.trailing_dash(terms, label='color')
+    terms.drop('imperial_length')
+
+    # Used to filter paragraphs in the source documents.
+    para_re = [t['pattern'] for t in terms.with_label('part')]
+
+    return {
+        'terms': terms,
+        'ruler_patterns': terms.for_entity_ruler(),
+        'replace': terms.pattern_dict('replace'),
+        'remove': terms.pattern_dict('remove'),
+        'para_re': '|'.join(para_re),
+    }
+
+
+LAZY = {
+    'TERMS': lambda: term_artifact()['terms'],
+    'RULER_PATTERNS': lambda: term_artifact()['ruler_patterns'],
+    'REPLACE': lambda: term_artifact()['replace'],
+    'REMOVE': lambda: term_artifact()['remove'],
+    'PARA_RE': lambda: re.compile(term_artifact()['para_re']),
+}
+
+
+def __getattr__(name):
+    """Build a term constant the first time it is used."""
+    if name not in LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = LAZY[name]()
+    globals()[name] = value  # Later lookups find it without coming back here
+    return value
+
 
 # #########################################################################
 # Tokenizer constants
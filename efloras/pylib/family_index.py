@@ -0,0 +1,132 @@
+"""A sidecar index of what has already been read from a family's pages.
+
+Every downloaded family directory gets an SQLite file that remembers the
+trait paragraph chosen from each treatment page along with the page's
+modification time and size. Pages that have not changed since they were
+indexed do not need to be parsed again.
+
+It also holds the taxa found in the family tree pages. That table is
+rebuilt only when the page store's signature for the tree pages changes.
+"""
+
+import sqlite3
+
+INDEX_NAME = 'index.sqlite'
+
+
+def connect(family_dir, version):
+    """Open the index for the family directory.
+
+    The version identifies how paragraphs are chosen. If it differs from
+    the one the index was built with, the indexed paragraphs are dropped.
+    """
+    cxn = sqlite3.connect(str(family_dir / INDEX_NAME))
+    create_tables(cxn)
+
+    if get_meta(cxn, 'treatments') != version:
+        with cxn:
+            cxn.execute('DELETE FROM treatments;')
+            set_meta(cxn, 'treatments', version)
+
+    return cxn
+
+
+def get_meta(cxn, key):
+    """Get a value from the index's metadata."""
+    sql = 'SELECT value FROM meta WHERE key = ?;'
+    value = cxn.execute(sql, (key,)).fetchone()
+    return value[0] if value else None
+
+
+def set_meta(cxn, key, value):
+    """Save a value in the index's metadata."""
+    sql = 'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?);'
+    cxn.execute(sql, (key, value))
+
+
+def taxa_are_current(cxn, signature):
+    """Check if the taxa were indexed from the tree pages as they are now."""
+    return get_meta(cxn, 'tree') == signature
+
+
+def put_taxa(cxn, taxa, signature):
+    """Replace the indexed taxa with the ones parsed from the tree pages."""
+    with cxn:
+        cxn.execute('DELETE FROM taxa;')
+        cxn.executemany(
+            'INSERT INTO taxa (taxon_id, name, parent_id, rank, flora_id) '
+            'VALUES (:taxon_id, :name, :parent_id, :rank, :flora_id);', taxa)
+        set_meta(cxn, 'tree', signature)
+
+
+def get_taxon_names(cxn):
+    """Get taxon names keyed by taxon ID."""
+    return dict(cxn.execute('SELECT taxon_id, name FROM taxa;'))
+
+
+def count_taxa(family_dir):
+    """Count the indexed taxa for a family without building the index."""
+    path = family_dir / INDEX_NAME
+    if not path.exists():
+        return 0
+    cxn = sqlite3.connect(str(path))
+    create_tables(cxn)
+    count = cxn.execute('SELECT COUNT(*) FROM taxa;').fetchone()[0]
+    cxn.close()
+    return count
+
+
+def get_stats(cxn):
+    """Get the modification time & size of every indexed treatment page."""
+    sql = 'SELECT name, mtime, size FROM treatments;'
+    return {r[0]: (r[1], r[2]) for r in cxn.execute(sql)}
+
+
+def get_text(cxn, name):
+    """Get the indexed trait paragraph for a treatment page."""
+    sql = 'SELECT text FROM treatments WHERE name = ?;'
+    return cxn.execute(sql, (name,)).fetchone()[0]
+
+
+def put_treatment(cxn, name, taxon_id, stat, text):
+    """Save the trait paragraph for a treatment page."""
+    cxn.execute(
+        'INSERT OR REPLACE INTO treatments (name, taxon_id, mtime, size, text) '
+        'VALUES (?, ?, ?, ?, ?);',
+        (name, taxon_id, stat.st_mtime, stat.st_size, text))
+
+
+def is_current(stats, name, stat):
+    """Check if the page is unchanged since it was indexed."""
+    return stats.get(name) == (stat.st_mtime, stat.st_size)
+
+
+def create_tables(cxn):
+    """Create tables and indices."""
+    cxn.executescript("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+
+    cxn.executescript("""
+        CREATE TABLE IF NOT EXISTS treatments (
+            name     TEXT PRIMARY KEY,
+            taxon_id INTEGER,
+            mtime    REAL,
+            size     INTEGER,
+            text     TEXT
+        );
+    """)
+
+    cxn.executescript("""
+        CREATE TABLE IF NOT EXISTS taxa (
+            taxon_id  INTEGER PRIMARY KEY,
+            name      TEXT,
+            parent_id INTEGER,
+            rank      TEXT,
+            flora_id  INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS taxa_parent_id ON taxa (parent_id);
+    """)
@@ -0,0 +1,292 @@
+"""Download web pages politely and concurrently.
+
+Worker threads share a token bucket that caps the overall request rate and
+a per-host limit on simultaneous requests. Each thread keeps its HTTP
+connections alive and reuses them. Failed requests are retried with
+exponential backoff.
+"""
+
+import hashlib
+import http.client
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePath
+from urllib.parse import urljoin, urlsplit
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+REDIRECT_STATUS = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+
+USER_AGENT = f'Python-urllib/{sys.version_info[0]}.{sys.version_info[1]}'
+
+Response = namedtuple('Response', 'url status headers body')
+Saved = namedtuple('Saved', 'url path changed validators')
+
+
+class FetchError(Exception):
+    """A page could not be downloaded."""
+
+
+class TokenBucket:
+    """Limit how often requests are made across all threads."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request is allowed."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Fetcher:
+    """Download pages with a shared rate limit and connection reuse."""
+
+    def __init__(
+            self, rate=1 / 15, burst=1, per_host=2, workers=4, retries=10,
+            backoff=2.0, max_backoff=300.0, timeout=30):
+        if retries < 1:
+            raise ValueError('A page must be tried at least once.')
+        self.bucket = TokenBucket(rate, burst)
+        self.per_host = per_host
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.hosts = {}
+        self.opened = []
+        self.pool = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Stop the worker threads and close every connection they opened.
+
+        A closed connection reopens itself if its thread uses it again.
+        """
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+        with self.lock:
+            for cxn in self.opened:
+                cxn.close()
+            self.opened = []
+
+    def fetch(self, url):
+        """Get the body of the page at the URL."""
+        response = self.get(url)
+        if response.status != 200:
+            raise FetchError(f'{url}: HTTP {response.status}')
+        return response.body
+
+    def save(self, url, path, validators=None):
+        """Download the page at the URL into the file or page store entry.
+
+        With validators from an earlier download (etag, last_modified,
+        sha256) and the page still on hand, the request is conditional and
+        the file is only rewritten when the page's content really changed.
+
+        A file is written under a temporary name and then moved into place
+        so a partial download never looks like a finished one. Page store
+        entries write themselves.
+        """
+        exists = path.exists()
+        headers = conditional_headers(validators) if exists else None
+        response = self.get(url, headers)
+
+        if response.status == 304 and exists:
+            return Saved(url, path, False, validators)
+
+        if response.status != 200:
+            raise FetchError(f'{url}: HTTP {response.status}')
+
+        new = {
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'sha256': hashlib.sha256(response.body).hexdigest(),
+        }
+        changed = not validators or validators.get('sha256') != new['sha256']
+
+        if changed or not exists:
+            write_page(path, response.body)
+
+        return Saved(url, path, changed, new)
+
+    def download_all(self, jobs):
+        """Save pages concurrently.
+
+        Each job is a (url, path) or (url, path, validators) tuple. This
+        returns what was saved & the (url, error) pairs for any failures.
+
+        The worker threads, and the connections they keep alive, last from
+        one call to the next until the fetcher is closed.
+        """
+        if not self.pool:
+            self.pool = ThreadPoolExecutor(self.workers)
+
+        saved = []
+        failures = []
+        futures = {self.pool.submit(self.save, *j): j[0] for j in jobs}
+        for future, url in futures.items():
+            try:
+                saved.append(future.result())
+            except FetchError as err:
+                failures.append((url, err))
+        return saved, failures
+
+    def get(self, url, headers=None):
+        """Make a GET request, following redirects and retrying failures.
+
+        Responses with a status that is not worth retrying are returned as
+        they are so callers can handle things like 304 Not Modified.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self.get_with_retries(url, headers)
+            if response.status not in REDIRECT_STATUS:
+                return response
+            url = urljoin(url, response.headers.get('location', ''))
+        raise FetchError(f'{url}: too many redirects')
+
+    def get_with_retries(self, url, headers=None):
+        """Try a request until it works or we run out of attempts."""
+        error = None
+        for attempt in range(self.retries):
+            if attempt:
+                time.sleep(self.delay(attempt))
+            try:
+                response = self.request(url, headers)
+            except (OSError, http.client.HTTPException) as err:
+                error = err
+                continue
+            if response.status not in RETRY_STATUS:
+                return response
+            error = f'HTTP {response.status}'
+        raise FetchError(f'{url}: {error}')
+
+    def delay(self, attempt):
+        """Exponential backoff with jitter."""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def request(self, url, headers=None):
+        """Make one request on this thread's connection to the host."""
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += f'?{parts.query}'
+
+        headers = {'User-Agent': USER_AGENT, **(headers or {})}
+
+        with self.host_limit(parts.netloc):
+            self.bucket.acquire()
+            cxn = self.connection(parts.scheme, parts.netloc)
+            try:
+                cxn.request('GET', path, headers=headers)
+                resp = cxn.getresponse()
+                body = resp.read()
+            except (OSError, http.client.HTTPException):
+                self.drop_connection(parts.scheme, parts.netloc)
+                raise
+
+        if resp.will_close:
+            self.drop_connection(parts.scheme, parts.netloc)
+
+        resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+        return Response(url, resp.status, resp_headers, body)
+
+    def host_limit(self, host):
+        """Get the semaphore limiting concurrent requests to the host."""
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = threading.Semaphore(self.per_host)
+            return self.hosts[host]
+
+    def connection(self, scheme, host):
+        """Get this thread's open connection to the host."""
+        connections = self.local.__dict__.setdefault('connections', {})
+        key = (scheme, host)
+        if key not in connections:
+            if scheme == 'https':
+                cxn = http.client.HTTPSConnection(host, timeout=self.timeout)
+            else:
+                cxn = http.client.HTTPConnection(host, timeout=self.timeout)
+            connections[key] = cxn
+            with self.lock:
+                self.opened.append(cxn)
+        return connections[key]
+
+    def drop_connection(self, scheme, host):
+        """Close this thread's connection to the host."""
+        connections = self.local.__dict__.get('connections', {})
+        cxn = connections.pop((scheme, host), None)
+        if cxn:
+            cxn.close()
+
+
+def conditional_headers(validators):
+    """Build the headers that let the server say a page is unchanged."""
+    headers = {}
+    if validators and validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators and validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def file_validators(path):
+    """Build validators for a page downloaded before they were recorded."""
+    if not path.exists():
+        return None
+    sha256 = hashlib.sha256(path.read_bytes()).hexdigest()
+    return {'etag': None, 'last_modified': None, 'sha256': sha256}
+
+
+def write_page(path, body):
+    """Write a page to a file or a page store entry."""
+    if isinstance(path, PurePath):
+        write_atomic(path, body)
+    else:
+        path.write_bytes(body)
+
+
+def write_atomic(path, body):
+    """Write the file under a temporary name and then move it into place.
+
+    Every write gets its own temporary file so writes to the same path do
+    not trip over each other.
+    """
+    with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=f'{path.name}.', suffix='.part',
+            delete=False) as out_file:
+        out_file.write(body)
+    try:
+        os.replace(out_file.name, path)
+    except OSError:
+        os.unlink(out_file.name)
+        raise
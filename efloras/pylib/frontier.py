@@ -0,0 +1,135 @@
+"""A persistent queue of the pages to crawl for a family.
+
+The frontier lives in an SQLite file in the family's directory. Pages are
+added as they are discovered and marked done (or failed) as they are
+downloaded, so a crawl that is killed can pick up where it stopped.
+
+The same file keeps the HTTP validators (ETag, Last-Modified, and a content
+hash) of every saved page so a refresh can ask the server for only the pages
+that changed, and it records which pages did change.
+"""
+
+import sqlite3
+
+FRONTIER_NAME = 'crawl.sqlite'
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def connect(family_dir):
+    """Open the crawl frontier for the family directory."""
+    cxn = sqlite3.connect(str(family_dir / FRONTIER_NAME))
+    create_tables(cxn)
+    return cxn
+
+
+def reset(cxn):
+    """Forget the old crawl."""
+    with cxn:
+        cxn.execute('DELETE FROM frontier;')
+        cxn.execute('DELETE FROM changes;')
+
+
+def retry_failed(cxn):
+    """Put failed pages back into the queue."""
+    with cxn:
+        cxn.execute(
+            'UPDATE frontier SET status = ? WHERE status = ?;', (PENDING, FAILED))
+
+
+def add(cxn, pages):
+    """Queue pages that have not been seen before."""
+    cxn.executemany(
+        'INSERT OR IGNORE INTO frontier (url, kind, taxon_id, page_no, status) '
+        f"VALUES (:url, :kind, :taxon_id, :page_no, '{PENDING}');",
+        pages)
+
+
+def pending(cxn, kind, limit):
+    """Get the next batch of pages waiting to be crawled."""
+    sql = """SELECT url, kind, taxon_id, page_no FROM frontier
+              WHERE kind = ? AND status = ? ORDER BY seq LIMIT ?;"""
+    rows = cxn.execute(sql, (kind, PENDING, limit))
+    return [dict(zip(('url', 'kind', 'taxon_id', 'page_no'), r)) for r in rows]
+
+
+def mark(cxn, urls, status):
+    """Record the outcome of crawling the pages."""
+    cxn.executemany(
+        'UPDATE frontier SET status = ? WHERE url = ?;',
+        [(status, u) for u in urls])
+
+
+def get_validators(cxn, urls):
+    """Get the saved validators for the pages."""
+    sql = """SELECT url, etag, last_modified, sha256 FROM validators
+              WHERE url = ?;"""
+    found = {}
+    for url in urls:
+        if row := cxn.execute(sql, (url,)).fetchone():
+            found[url] = dict(zip(('etag', 'last_modified', 'sha256'), row[1:]))
+    return found
+
+
+def put_validators(cxn, saved):
+    """Save the validators of downloaded pages."""
+    cxn.executemany(
+        'INSERT OR REPLACE INTO validators (url, etag, last_modified, sha256) '
+        'VALUES (?, ?, ?, ?);',
+        [(s.url, s.validators['etag'], s.validators['last_modified'],
+          s.validators['sha256']) for s in saved])
+
+
+def add_changes(cxn, pages):
+    """Record the pages whose content changed."""
+    cxn.executemany(
+        'INSERT OR IGNORE INTO changes (url, kind, taxon_id) '
+        'VALUES (:url, :kind, :taxon_id);',
+        pages)
+
+
+def changed_taxon_ids(cxn, kind='treatment'):
+    """Get the taxon IDs of the pages that changed."""
+    sql = 'SELECT DISTINCT taxon_id FROM changes WHERE kind = ? ORDER BY taxon_id;'
+    return [r[0] for r in cxn.execute(sql, (kind,))]
+
+
+def counts(cxn):
+    """Count the pages by kind and status."""
+    sql = 'SELECT kind, status, COUNT(*) FROM frontier GROUP BY kind, status;'
+    return {(k, s): n for k, s, n in cxn.execute(sql)}
+
+
+def create_tables(cxn):
+    """Create tables and indices."""
+    cxn.executescript("""
+        CREATE TABLE IF NOT EXISTS frontier (
+            seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+            url      TEXT UNIQUE,
+            kind     TEXT,
+            taxon_id INTEGER,
+            page_no  INTEGER,
+            status   TEXT
+        );
+        CREATE INDEX IF NOT EXISTS frontier_status
+            ON frontier (kind, status, seq);
+    """)
+
+    cxn.executescript("""
+        CREATE TABLE IF NOT EXISTS validators (
+            url           TEXT PRIMARY KEY,
+            etag          TEXT,
+            last_modified TEXT,
+            sha256        TEXT
+        );
+    """)
+
+    cxn.executescript("""
+        CREATE TABLE IF NOT EXISTS changes (
+            url      TEXT PRIMARY KEY,
+            kind     TEXT,
+            taxon_id INTEGER
+        );
+    """)
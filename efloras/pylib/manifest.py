@@ -0,0 +1,83 @@
+"""A manifest of the downloaded families.
+
+Counting the treatment pages of every family on disk is slow once many
+families are downloaded. The downloader records each family's treatment
+count and directory times here after it downloads the family, and the
+reader records the taxon count after it indexes the family tree. Listing
+families then reads one small table.
+"""
+
+import sqlite3
+from datetime import datetime
+
+from efloras.pylib import family_index, page_store
+from efloras.pylib.const import EFLORAS_DIR, MANIFEST
+
+
+def connect(path=MANIFEST, root=EFLORAS_DIR):
+    """Open the manifest, building it from the family directories if needed."""
+    exists = path.exists()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cxn = sqlite3.connect(str(path))
+    create_tables(cxn)
+    if not exists:
+        rebuild(cxn, root)
+    return cxn
+
+
+def rebuild(cxn, root=EFLORAS_DIR):
+    """Record every family directory on disk."""
+    with cxn:
+        cxn.execute('DELETE FROM families;')
+        for dir_ in sorted(root.glob('*_*')):
+            family, _, flora_id = dir_.name.rpartition('_')
+            if dir_.is_dir() and flora_id.isdigit():
+                update(cxn, dir_, family, int(flora_id))
+
+
+def update(cxn, family_dir, family, flora_id):
+    """Record the current state of one family directory."""
+    entry = {
+        'family': family.lower(),
+        'flora_id': flora_id,
+        'count': page_store.count_pages(family_dir, flora_id, 'treatment'),
+        'taxa': family_index.count_taxa(family_dir),
+        'created': '',
+        'modified': '',
+    }
+
+    if entry['count']:
+        stat = family_dir.stat()
+        entry['created'] = datetime.fromtimestamp(
+            stat.st_ctime).strftime('%Y-%m-%d %H:%M')
+        entry['modified'] = datetime.fromtimestamp(
+            stat.st_mtime).strftime('%Y-%m-%d %H:%M')
+
+    cxn.execute(
+        'INSERT OR REPLACE INTO families '
+        '(family, flora_id, count, taxa, created, modified) '
+        'VALUES (:family, :flora_id, :count, :taxa, :created, :modified);',
+        entry)
+
+
+def get_families(cxn):
+    """Get the recorded families keyed by (family, flora_id)."""
+    sql = 'SELECT family, flora_id, count, taxa, created, modified FROM families;'
+    return {(r[0], r[1]): {
+        'count': r[2], 'taxa': r[3], 'created': r[4], 'modified': r[5]}
+        for r in cxn.execute(sql)}
+
+
+def create_tables(cxn):
+    """Create tables and indices."""
+    cxn.executescript("""
+        CREATE TABLE IF NOT EXISTS families (
+            family   TEXT,
+            flora_id INTEGER,
+            count    INTEGER,
+            taxa     INTEGER,
+            created  TEXT,
+            modified TEXT,
+            PRIMARY KEY (family, flora_id)
+        );
+    """)
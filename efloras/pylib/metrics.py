@@ -0,0 +1,104 @@
+"""Count and time what the reader and writers do.
+
+Stages record named counters (rows read, bytes parsed, rows inserted, ...)
+and spans (elapsed time for a named piece of work). Both are kept for the
+whole process and can be written at the end of a run as structured log
+lines (one JSON object per metric) or as a Prometheus text file that a
+scheduler can scrape. Writers run in their own threads so updates are
+locked.
+"""
+
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from time import perf_counter
+
+PREFIX = 'efloras'
+
+LOCK = threading.Lock()
+COUNTERS = {}
+SPANS = {}  # name -> [calls, seconds]
+
+
+def count(name, value=1):
+    """Add to a counter."""
+    with LOCK:
+        COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+
+@contextmanager
+def span(name):
+    """Time the work done inside the block."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        with LOCK:
+            calls_seconds = SPANS.setdefault(name, [0, 0.0])
+            calls_seconds[0] += 1
+            calls_seconds[1] += elapsed
+
+
+def reset():
+    """Forget everything recorded so far."""
+    with LOCK:
+        COUNTERS.clear()
+        SPANS.clear()
+
+
+def snapshot():
+    """Get a copy of the counters and spans."""
+    with LOCK:
+        counters = dict(COUNTERS)
+        spans = {k: {'calls': v[0], 'seconds': v[1]} for k, v in SPANS.items()}
+    return counters, spans
+
+
+def write(path, format_='log'):
+    """Write the metrics in the format."""
+    counters, spans = snapshot()
+    lines = FORMATS[format_](counters, spans)
+    with open(path, 'w') as out_file:
+        out_file.writelines(f'{ln}\n' for ln in lines)
+
+
+def log_lines(counters, spans):
+    """Format metrics as structured log lines."""
+    now = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    for name, value in sorted(counters.items()):
+        yield json.dumps(
+            {'time': now, 'type': 'counter', 'name': name, 'value': value})
+    for name, span_ in sorted(spans.items()):
+        yield json.dumps({
+            'time': now, 'type': 'span', 'name': name,
+            'calls': span_['calls'], 'seconds': round(span_['seconds'], 6)})
+
+
+def prometheus_lines(counters, spans):
+    """Format metrics in the Prometheus text exposition format."""
+    for name, value in sorted(counters.items()):
+        metric = metric_name(name, 'total')
+        yield f'# TYPE {metric} counter'
+        yield f'{metric} {value}'
+    for name, span_ in sorted(spans.items()):
+        metric = metric_name(name, 'seconds_total')
+        yield f'# TYPE {metric} counter'
+        yield f'{metric} {span_["seconds"]:.6f}'
+        metric = metric_name(name, 'calls_total')
+        yield f'# TYPE {metric} counter'
+        yield f'{metric} {span_["calls"]}'
+
+
+def metric_name(name, suffix):
+    """Build a legal Prometheus metric name."""
+    name = re.sub(r'[^a-zA-Z0-9_]', '_', name)
+    return f'{PREFIX}_{name}_{suffix}'
+
+
+FORMATS = {
+    'log': log_lines,
+    'prometheus': prometheus_lines,
+}
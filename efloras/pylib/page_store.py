@@ -0,0 +1,259 @@
+"""Where downloaded pages are kept.
+
+Pages are keyed by their kind ("tree" or "treatment"), taxon ID, and page
+number within a family & flora directory. There are two backends:
+
+files:   One HTML file per page under tree/ and treatments/. This is the
+         original layout.
+archive: One SQLite file per family. Pages are zlib compressed and stored
+         once per distinct content, keyed by their SHA-256 hash.
+
+Both hand out page objects with the parts of the pathlib.Path interface the
+downloader and reader use: name, exists(), stat(), read_bytes(),
+read_text(), and write_bytes(). For the files backend they are Paths.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+ARCHIVE_NAME = 'pages.sqlite'
+
+KIND_DIRS = {'tree': 'tree', 'treatment': 'treatments'}
+
+PageStat = namedtuple('PageStat', 'st_mtime st_size')
+
+
+def open_store(family_dir, flora_id, backend=None):
+    """Open the page store for a family directory.
+
+    Without a backend, use the archive if there is one and loose files if not.
+    """
+    if backend is None:
+        backend = 'archive' if (family_dir / ARCHIVE_NAME).exists() else 'files'
+    return BACKENDS[backend](family_dir, flora_id)
+
+
+def page_name(taxon_id, page_no=1):
+    """Build the name of a page."""
+    if page_no > 1:
+        return f'taxon_id_{taxon_id}_{page_no}.html'
+    return f'taxon_id_{taxon_id}.html'
+
+
+def count_pages(family_dir, flora_id, kind):
+    """Count the pages of one kind for a family."""
+    store = open_store(family_dir, flora_id)
+    count = store.count(kind)
+    store.close()
+    return count
+
+
+class FileStore:
+    """Keep each page in its own HTML file."""
+
+    def __init__(self, family_dir, flora_id):
+        self.family_dir = family_dir
+        self.flora_id = flora_id
+
+    def create(self):
+        """Make the directories for the pages."""
+        for dir_ in KIND_DIRS.values():
+            os.makedirs(self.family_dir / dir_, exist_ok=True)
+
+    def page(self, kind, taxon_id, page_no=1):
+        """Get a page by its key."""
+        return self.kind_dir(kind) / page_name(taxon_id, page_no)
+
+    def pages(self, kind):
+        """Get all pages of one kind."""
+        return sorted(self.kind_dir(kind).glob('*.html'))
+
+    def count(self, kind):
+        """Count the pages of one kind."""
+        return len(list(self.kind_dir(kind).glob('*.html')))
+
+    def signature(self, kind):
+        """Identify the current state of the pages of one kind.
+
+        Adding, removing, or replacing a file in the directory changes the
+        directory's modification time.
+        """
+        dir_ = self.kind_dir(kind)
+        return str(dir_.stat().st_mtime_ns) if dir_.exists() else ''
+
+    def kind_dir(self, kind):
+        """Get the directory holding pages of one kind."""
+        return self.family_dir / KIND_DIRS[kind]
+
+    def close(self):
+        """Nothing to close for files."""
+
+
+class ArchiveStore:
+    """Keep compressed pages in one SQLite file per family."""
+
+    def __init__(self, family_dir, flora_id):
+        self.family_dir = family_dir
+        self.flora_id = flora_id
+        self.lock = threading.Lock()
+        os.makedirs(family_dir, exist_ok=True)
+        self.cxn = sqlite3.connect(
+            str(family_dir / ARCHIVE_NAME), check_same_thread=False)
+        self.create_tables()
+
+    def create(self):
+        """The archive is created when it is opened."""
+
+    def page(self, kind, taxon_id, page_no=1):
+        """Get a page by its key."""
+        return ArchivePage(self, kind, int(taxon_id), page_no)
+
+    def pages(self, kind):
+        """Get all pages of one kind."""
+        sql = """SELECT taxon_id, page_no FROM pages
+                  WHERE flora_id = ? AND kind = ? ORDER BY taxon_id, page_no;"""
+        with self.lock:
+            keys = self.cxn.execute(sql, (self.flora_id, kind)).fetchall()
+        return [ArchivePage(self, kind, t, p) for t, p in keys]
+
+    def count(self, kind):
+        """Count the pages of one kind."""
+        sql = 'SELECT COUNT(*) FROM pages WHERE flora_id = ? AND kind = ?;'
+        with self.lock:
+            return self.cxn.execute(sql, (self.flora_id, kind)).fetchone()[0]
+
+    def signature(self, kind):
+        """Identify the current state of the pages of one kind."""
+        sql = """SELECT COUNT(*), MAX(modified) FROM pages
+                  WHERE flora_id = ? AND kind = ?;"""
+        with self.lock:
+            count, modified = self.cxn.execute(
+                sql, (self.flora_id, kind)).fetchone()
+        return f'{count}:{modified}' if count else ''
+
+    def stat(self, kind, taxon_id, page_no):
+        """Get the modification time and size of a page."""
+        sql = """SELECT modified, size FROM pages
+                  WHERE flora_id = ? AND kind = ? AND taxon_id = ? AND page_no = ?;"""
+        with self.lock:
+            row = self.cxn.execute(
+                sql, (self.flora_id, kind, taxon_id, page_no)).fetchone()
+        if not row:
+            raise FileNotFoundError(page_name(taxon_id, page_no))
+        return PageStat(*row)
+
+    def read(self, kind, taxon_id, page_no):
+        """Get the contents of a page."""
+        sql = """SELECT body FROM pages JOIN blobs USING (sha256)
+                  WHERE flora_id = ? AND kind = ? AND taxon_id = ? AND page_no = ?;"""
+        with self.lock:
+            row = self.cxn.execute(
+                sql, (self.flora_id, kind, taxon_id, page_no)).fetchone()
+        if not row:
+            raise FileNotFoundError(page_name(taxon_id, page_no))
+        return zlib.decompress(row[0])
+
+    def write(self, kind, taxon_id, page_no, body):
+        """Save a page, storing its contents only if they are new."""
+        sha256 = hashlib.sha256(body).hexdigest()
+        key = (self.flora_id, kind, taxon_id, page_no)
+        with self.lock, self.cxn:
+            sql = """SELECT sha256 FROM pages WHERE flora_id = ? AND kind = ?
+                                                AND taxon_id = ? AND page_no = ?;"""
+            old = self.cxn.execute(sql, key).fetchone()
+            self.cxn.execute(
+                'INSERT OR IGNORE INTO blobs (sha256, body) VALUES (?, ?);',
+                (sha256, zlib.compress(body)))
+            self.cxn.execute(
+                """INSERT OR REPLACE INTO pages
+                   (flora_id, kind, taxon_id, page_no, sha256, size, modified)
+                   VALUES (?, ?, ?, ?, ?, ?, ?);""",
+                (*key, sha256, len(body), time.time()))
+            if old and old[0] != sha256:
+                self.cxn.execute(
+                    """DELETE FROM blobs WHERE sha256 = ? AND NOT EXISTS
+                       (SELECT 1 FROM pages WHERE pages.sha256 = blobs.sha256);""",
+                    old)
+
+    def close(self):
+        """Close the archive."""
+        self.cxn.close()
+
+    def create_tables(self):
+        """Create tables and indices."""
+        self.cxn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                body   BLOB
+            );
+        """)
+
+        self.cxn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                flora_id INTEGER,
+                kind     TEXT,
+                taxon_id INTEGER,
+                page_no  INTEGER,
+                sha256   TEXT,
+                size     INTEGER,
+                modified REAL,
+                PRIMARY KEY (flora_id, kind, taxon_id, page_no)
+            );
+            CREATE INDEX IF NOT EXISTS pages_sha256 ON pages (sha256);
+        """)
+
+
+class ArchivePage:
+    """A page in an archive that acts enough like a Path."""
+
+    def __init__(self, store, kind, taxon_id, page_no=1):
+        self.store = store
+        self.kind = kind
+        self.taxon_id = taxon_id
+        self.page_no = page_no
+        self.name = page_name(taxon_id, page_no)
+
+    def __repr__(self):
+        return f'{self.store.family_dir / ARCHIVE_NAME}:{self.kind}/{self.name}'
+
+    def __str__(self):
+        return repr(self)
+
+    def __lt__(self, other):
+        return (self.kind, self.taxon_id, self.page_no) < (
+            other.kind, other.taxon_id, other.page_no)
+
+    def exists(self):
+        """Check if the page is in the archive."""
+        try:
+            self.stat()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def stat(self):
+        """Get the page's modification time and size."""
+        return self.store.stat(self.kind, self.taxon_id, self.page_no)
+
+    def read_bytes(self):
+        """Get the page contents."""
+        return self.store.read(self.kind, self.taxon_id, self.page_no)
+
+    def read_text(self):
+        """Get the page contents as text."""
+        return self.read_bytes().decode()
+
+    def write_bytes(self, body):
+        """Save the page contents."""
+        self.store.write(self.kind, self.taxon_id, self.page_no, body)
+
+
+BACKENDS = {
+    'files': FileStore,
+    'archive': ArchiveStore,
+}
@@ -0,0 +1,100 @@
+"""Cache parsed treatments on disk.
+
+Records are keyed by a hash of the treatment text combined with a
+fingerprint of everything that affects parsing: the pattern modules, the
+pipeline code, the traiter term CSVs & pipes, and the spaCy & model versions.
+Changing any of them changes every key, so stale records are never served.
+"""
+
+import hashlib
+import pickle
+import sqlite3
+from functools import lru_cache
+from pathlib import Path
+
+import traiter
+
+from efloras.pylib.const import PARSE_CACHE
+from efloras.pylib.util import chunked
+
+MODEL = 'en_core_web_sm'
+
+EFLORAS_DIR = Path(__file__).resolve().parents[1]
+TRAITER_DIR = Path(traiter.__path__[0]).resolve()
+
+SQL_VARIABLES = 500  # Stay well under SQLite's host parameter limit
+
+
+def connect(path=PARSE_CACHE):
+    """Open the cache and drop records from other pipeline versions."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cxn = sqlite3.connect(str(path))
+    cxn.executescript("""
+        CREATE TABLE IF NOT EXISTS parses (
+            key         TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            record      BLOB
+        );
+    """)
+    with cxn:
+        cxn.execute(
+            'DELETE FROM parses WHERE fingerprint <> ?;', (fingerprint(),))
+    return cxn
+
+
+def get(cxn, keys):
+    """Get the cached records for the keys."""
+    found = {}
+    for batch in chunked(set(keys), SQL_VARIABLES):
+        params = ', '.join('?' * len(batch))
+        sql = f'SELECT key, record FROM parses WHERE key IN ({params});'
+        found |= {k: pickle.loads(r) for k, r in cxn.execute(sql, batch)}
+    return found
+
+
+def put(cxn, records):
+    """Save new records keyed by text key.
+
+    Records are pickled so they come back exactly as they were parsed, with
+    tuples still tuples.
+    """
+    current = fingerprint()
+    with cxn:
+        cxn.executemany(
+            'INSERT OR REPLACE INTO parses (key, fingerprint, record) '
+            'VALUES (?, ?, ?);',
+            [(k, current, pickle.dumps(r, pickle.HIGHEST_PROTOCOL))
+             for k, r in records.items()])
+
+
+def text_key(text, profile):
+    """Build the cache key for the treatment text & pipeline profile."""
+    digest = hashlib.sha256(fingerprint().encode())
+    digest.update(profile.encode())
+    digest.update(text.encode())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def fingerprint():
+    """Hash everything that can change how a treatment is parsed."""
+    import spacy  # pylint: disable=import-outside-toplevel
+
+    digest = hashlib.sha256()
+    digest.update(spacy.__version__.encode())
+    digest.update(str(spacy.util.get_package_version(MODEL)).encode())
+    for root, path in source_files():
+        digest.update(str(path.relative_to(root)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def source_files():
+    """List the files whose contents change the parse results."""
+    paths = [(EFLORAS_DIR, p) for p in sorted(EFLORAS_DIR.glob('patterns/*.py'))]
+    paths += [(EFLORAS_DIR, EFLORAS_DIR / 'pylib' / f)
+              for f in ('const.py', 'parse_cache.py', 'pipeline.py', 'records.py',
+                        'term_cache.py')]
+    paths += [(TRAITER_DIR, p) for p in sorted(TRAITER_DIR.glob('**/*.csv'))]
+    paths += [(TRAITER_DIR, p) for p in sorted(TRAITER_DIR.glob('**/*.py'))]
+    return paths
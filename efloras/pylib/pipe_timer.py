@@ -0,0 +1,84 @@
+"""Time each component of the spaCy pipeline.
+
+Texts are run through the pipeline one component at a time, the same way
+nlp.pipe runs them, so each component's share of the time can be measured.
+Timings are plain dicts so they can be sent back from worker processes and
+added together.
+"""
+
+import json
+import sys
+from time import perf_counter
+
+
+def pipe(nlp, texts, timings, batch_size=1000):
+    """Run the texts through the pipeline and time every component."""
+    start = perf_counter()
+    docs = [nlp.make_doc(t) for t in texts]
+    add(timings, 'tokenizer', perf_counter() - start, docs)
+
+    for name, proc in nlp.pipeline:
+        start = perf_counter()
+        if hasattr(proc, 'pipe'):
+            docs = list(proc.pipe(docs, batch_size=batch_size))
+        else:
+            docs = [proc(d) for d in docs]
+        add(timings, name, perf_counter() - start, docs)
+
+    return docs
+
+
+def add(timings, name, seconds, docs):
+    """Add one component's time for a batch of docs."""
+    timing = timings.setdefault(name, {'seconds': 0.0, 'docs': 0, 'tokens': 0})
+    timing['seconds'] += seconds
+    timing['docs'] += len(docs)
+    timing['tokens'] += sum(len(d) for d in docs)
+
+
+def merge(total, timings):
+    """Add timings from another process into the total."""
+    for name, timing in timings.items():
+        entry = total.setdefault(name, {'seconds': 0.0, 'docs': 0, 'tokens': 0})
+        for key, value in timing.items():
+            entry[key] += value
+
+
+def summary(timings):
+    """Build a report row for every component in pipeline order."""
+    total = sum(t['seconds'] for t in timings.values())
+    rows = []
+    for name, timing in timings.items():
+        seconds = timing['seconds']
+        rows.append({
+            'component': name,
+            'seconds': round(seconds, 6),
+            'share': round(seconds / total, 4) if total else 0.0,
+            'docs': timing['docs'],
+            'tokens': timing['tokens'],
+            'docs_per_sec': round(timing['docs'] / seconds, 1) if seconds else 0.0,
+            'tokens_per_sec': round(timing['tokens'] / seconds, 1) if seconds else 0.0,
+        })
+    return rows
+
+
+def report(timings, path=None):
+    """Write the summary as JSON to the path or print it as a table."""
+    rows = summary(timings)
+
+    if path:
+        with open(path, 'w') as out_file:
+            json.dump(rows, out_file, indent=2)
+        return
+
+    template = '{:<20} {:>10} {:>7} {:>10} {:>12}'
+    print(template.format(
+        'Component', 'Seconds', 'Share', 'Docs/sec', 'Tokens/sec'),
+        file=sys.stderr)
+    for row in rows:
+        print(template.format(
+            row['component'],
+            f"{row['seconds']:.3f}",
+            f"{row['share']:.1%}",
+            f"{row['docs_per_sec']:.1f}",
+            f"{row['tokens_per_sec']:.0f}"), file=sys.stderr)
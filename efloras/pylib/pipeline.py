@@ -1,4 +1,15 @@
-"""Create a trait pipeline."""
+"""Create a trait pipeline.
+
+Building the pipeline from the term CSVs and patterns is slow so the built
+pipeline is saved to disk and loaded from there. It is rebuilt whenever
+anything that goes into it changes.
+"""
+
+import fcntl
+import os
+import shutil
+import tempfile
+from pathlib import Path
 
 import spacy
 from traiter.patterns.matcher_patterns import (
@@ -25,7 +36,8 @@ from efloras.patterns.sex_linker import SEX_LINKER
 from efloras.patterns.shape import N_SHAPE, SHAPE
 from efloras.patterns.size import NOT_A_SIZE, SIZE, SIZE_DOUBLE_DIM, SIZE_HIGH_ONLY
 from efloras.patterns.subpart_linker import SUBPART_LINKER
-from efloras.pylib.const import ABBREVS, FORGET, REPLACE, TERMS
+from efloras.pylib import const, parse_cache
+from efloras.pylib.const import ABBREVS, FORGET, PIPELINE_CACHE
 
 TERM_RULES = [
     RANGE_LOW, RANGE_MIN_LOW, RANGE_LOW_HIGH, RANGE_LOW_MAX, RANGE_MIN_LOW_HIGH,
@@ -39,10 +51,83 @@ UPDATE_DATA = [
 
 LINKERS = [LOCATION_LINKER, PART_LINKER, SEX_LINKER, SUBPART_LINKER]
 
+FINGERPRINT = 'fingerprint.txt'
+
+# The en_core_web_sm components each profile leaves out.
+#
+# full:    Everything but the model's named entity recognizer.
+# minimal: The patterns only look at TEXT, LOWER, POS, ENT_TYPE, and the
+#          dependency parse, so the lemmatizer is dropped too. The senter is
+#          disabled in the model anyway and excluding it only saves loading
+#          it. POS comes from the tagger by way of the attribute_ruler, the
+#          linkers need the parser, and both of those need tok2vec, so
+#          nothing else can go.
+PROFILES = {
+    'full': ['ner'],
+    'minimal': ['ner', 'lemmatizer', 'senter'],
+}
+DEFAULT_PROFILE = 'full'
+
+
+def pipeline(cache=True, profile=DEFAULT_PROFILE):
+    """Get a pipeline for extracting traits.
+
+    Use the one saved on disk if it was built from the current patterns,
+    terms, and model. Otherwise, build it and save it for next time.
+    """
+    path = PIPELINE_CACHE / profile
+
+    if cache and is_current(path):
+        return spacy.load(path)
+
+    nlp = build_pipeline(profile)
+
+    if cache:
+        save_pipeline(nlp, path)
+
+    return nlp
+
+
+def is_current(path):
+    """Check if the saved pipeline was built from what is here now."""
+    path = path / FINGERPRINT
+    return path.exists() and path.read_text() == parse_cache.fingerprint()
+
+
+def save_pipeline(nlp, path):
+    """Save the pipeline, replacing any old one.
+
+    The pipeline is written to a temporary directory and renamed into place
+    so parallel workers never load a partly written one. Workers take turns
+    swapping it in, and one that finds a current pipeline already there
+    throws its copy away instead of replacing it.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = Path(tempfile.mkdtemp(dir=path.parent))
+    nlp.to_disk(temp)
+    (temp / FINGERPRINT).write_text(parse_cache.fingerprint())
+
+    with open(path.parent / f'{path.name}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        if is_current(path):
+            shutil.rmtree(temp, ignore_errors=True)
+            return
+
+        old = None
+        if path.exists():
+            old = Path(tempfile.mkdtemp(dir=path.parent))
+            os.replace(path, old / path.name)
+
+        os.replace(temp, path)
+
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+
 
-def pipeline():
+def build_pipeline(profile=DEFAULT_PROFILE):
     """Create a pipeline for extracting traits."""
-    nlp = spacy.load('en_core_web_sm', exclude=['ner'])
+    nlp = spacy.load('en_core_web_sm', exclude=PROFILES[profile])
     append_tokenizer_regexes(nlp)
     append_abbrevs(nlp, ABBREVS)
 
@@ -50,13 +135,14 @@ def pipeline():
     config = {'phrase_matcher_attr': 'LOWER'}
     term_ruler = nlp.add_pipe(
         'entity_ruler', name='term_ruler', config=config, before='parser')
-    term_ruler.add_patterns(TERMS.for_entity_ruler())
+    term_ruler.add_patterns(const.RULER_PATTERNS)
     add_ruler_patterns(term_ruler, TERM_RULES)
 
     nlp.add_pipe(SENTENCE, before='parser')
 
     nlp.add_pipe('merge_entities', name='term_merger')
-    nlp.add_pipe(SIMPLE_ENTITY_DATA, after='term_merger', config={'replace': REPLACE})
+    config = {'replace': const.REPLACE}
+    nlp.add_pipe(SIMPLE_ENTITY_DATA, after='term_merger', config=config)
 
     config = {'patterns': as_dicts(UPDATE_DATA)}
     nlp.add_pipe(UPDATE_ENTITY_DATA, name='update_entities', config=config)
@@ -0,0 +1,136 @@
+"""Turn parsed treatments into plain trait records.
+
+A record holds only what the writers need from a spaCy Doc: the sentence
+offsets and, for each entity, its offsets, label, trait data, and links to
+other entities. Records are plain Python objects so they are cheap to send
+between processes.
+
+The rows handed to the writers are read-only. Writers that need extra
+columns build their own views of a row instead of changing it.
+"""
+
+from collections import deque
+from types import MappingProxyType
+
+from efloras.pylib import metrics, parse_cache, pipe_timer
+from efloras.pylib.util import chunked, process_pool, submit
+
+NLP = {}  # Each process builds its own pipelines when it first needs them
+
+
+def parse(args, rows, timings=None):
+    """Parse the treatment text in each row and attach its trait record.
+
+    Rows are streamed through in chunks and come out in the same order they
+    went in, so only a few chunks are held in memory at any time. Treatments
+    already in the parse cache are not parsed again. With more than one
+    worker, chunks are parsed in a pool of processes with only a couple of
+    chunks per worker in flight.
+
+    When given a timings dict, the time spent in each pipeline component is
+    added to it.
+    """
+    timed = timings is not None
+    cxn = None if args.no_cache else parse_cache.connect()
+
+    with process_pool(args.workers) as pool:
+        pending = deque()
+
+        for chunk in chunked(rows, args.batch_size):
+            pending.append(
+                start_chunk(pool, cxn, chunk, args.pipeline, timed))
+            if len(pending) >= 2 * args.workers:
+                yield from finish_chunk(cxn, timings, *pending.popleft())
+
+        while pending:
+            yield from finish_chunk(cxn, timings, *pending.popleft())
+
+    if cxn:
+        cxn.close()
+
+
+def start_chunk(pool, cxn, chunk, profile, timed=False):
+    """Start parsing the treatments in the chunk that are not cached."""
+    texts = [r['text'] for r in chunk]
+    keys = [parse_cache.text_key(t, profile) for t in texts]
+    cached = parse_cache.get(cxn, keys) if cxn else {}
+    missed = [t for t, k in zip(texts, keys) if k not in cached]
+
+    metrics.count('parse.treatments_cached', len(chunk) - len(missed))
+    metrics.count('parse.treatments_parsed', len(missed))
+
+    with metrics.span('parse.submit'):
+        future = submit(pool, parse_chunk, missed, profile, timed)
+    return chunk, keys, cached, future
+
+
+def finish_chunk(cxn, timings, chunk, keys, cached, future):
+    """Merge cached and newly parsed records back into the chunk's rows."""
+    with metrics.span('parse.wait'):
+        parsed, chunk_timings = future.result()
+    parsed = iter(parsed)
+
+    if timings is not None:
+        pipe_timer.merge(timings, chunk_timings)
+    new = {}
+
+    for row, key in zip(chunk, keys):
+        if key in cached:
+            record = cached[key]
+        else:
+            record = new[key] = next(parsed)
+        yield MappingProxyType(row | record)
+
+    if cxn and new:
+        parse_cache.put(cxn, new)
+
+
+def parse_chunk(texts, profile, timed=False):
+    """Parse a chunk of texts in the current process.
+
+    This returns the records and, if timed, how long each pipeline
+    component took.
+    """
+    timings = {}
+
+    if not texts:
+        return [], timings
+
+    if profile not in NLP:
+        # Importing the pipeline is slow so leave it until there is text
+        # pylint: disable=import-outside-toplevel
+        from efloras.pylib.pipeline import pipeline
+        NLP[profile] = pipeline(profile=profile)
+
+    nlp = NLP[profile]
+
+    if timed:
+        docs = pipe_timer.pipe(nlp, texts, timings, batch_size=len(texts))
+    else:
+        docs = nlp.pipe(texts, batch_size=len(texts))
+
+    return [doc_to_record(d) for d in docs], timings
+
+
+def doc_to_record(doc):
+    """Extract the trait data from a doc.
+
+    Entity links are converted from character offsets into indices of the
+    linked entity in the record's entity list.
+    """
+    index = {(e.start_char, e.end_char): i for i, e in enumerate(doc.ents)}
+
+    ents = []
+    for ent in doc.ents:
+        links = {k: [index[tuple(i)] for i in v] for k, v in ent._.links.items()}
+        ents.append({
+            'start': ent.start_char,
+            'end': ent.end_char,
+            'label': ent.label_,
+            'data': dict(ent._.data),
+            'links': links,
+        })
+
+    sents = [[s.start_char, s.end_char] for s in doc.sents]
+
+    return {'ents': ents, 'sents': sents}
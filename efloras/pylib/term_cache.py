@@ -0,0 +1,66 @@
+"""Save the compiled terms so they are not rebuilt from the CSVs every run.
+
+The artifact holds the term list, the entity ruler patterns built from it,
+and the lookups derived from them. It is rebuilt whenever the traiter term
+CSVs, the recipe in const.py, or the artifact format change.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import traiter
+
+ARTIFACT_VERSION = 1  # Bump this when the artifact's contents change
+
+CONST_PY = Path(__file__).resolve().parent / 'const.py'
+TRAITER_DIR = Path(traiter.__path__[0]).resolve()
+
+
+def load(path, build):
+    """Load the artifact or build and save it if it is out of date."""
+    key = fingerprint()
+
+    try:
+        with open(path, 'rb') as in_file:
+            artifact = pickle.load(in_file)
+        if (artifact.get('version') == ARTIFACT_VERSION
+                and artifact.get('fingerprint') == key):
+            return artifact
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+            ImportError):
+        pass
+
+    artifact = build()
+    artifact |= {'version': ARTIFACT_VERSION, 'fingerprint': key}
+
+    try:
+        save(path, artifact)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        pass  # The terms still work, they will just be built again next time
+
+    return artifact
+
+
+def save(path, artifact):
+    """Write the artifact under a temporary name and then move it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp = tempfile.mkstemp(dir=path.parent, suffix='.part')
+    try:
+        with os.fdopen(handle, 'wb') as out_file:
+            pickle.dump(artifact, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    finally:
+        Path(temp).unlink(missing_ok=True)
+
+
+def fingerprint():
+    """Hash the files the terms are built from."""
+    digest = hashlib.sha256(str(ARTIFACT_VERSION).encode())
+    for root, path in [(CONST_PY.parent, CONST_PY)] + [
+            (TRAITER_DIR, p) for p in sorted(TRAITER_DIR.glob('**/*.csv'))]:
+        digest.update(str(path.relative_to(root)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
@@ -1,10 +1,17 @@
 """Misc. utils."""
 
 import csv
-from datetime import datetime
-from itertools import product
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice, product
+from queue import Full, Queue
+from threading import Thread
 
-from efloras.pylib.const import DATA_DIR, EFLORAS_FAMILIES
+from efloras.pylib import manifest
+from efloras.pylib.const import EFLORAS_FAMILIES
+
+DONE = object()  # Marks the end of a stream in a fan_out queue
 
 CONVERT = {
     'cm': 10.0,
@@ -32,33 +39,69 @@ def remove_traits(old_set: set, *remove: str) -> list:
 
 
 def get_families():
-    """Get a list of all families in the eFloras catalog."""
+    """Get a list of all families in the eFloras catalog.
+
+    What has been downloaded for each family comes from the manifest.
+    """
     families = {}
 
+    cxn = manifest.connect()
+    downloaded = manifest.get_families(cxn)
+    cxn.close()
+
     with open(EFLORAS_FAMILIES) as in_file:
 
         for family in csv.DictReader(in_file):
+            key = (family['family'].lower(), int(family['flora_id']))
 
-            times = {'created': '', 'modified': '', 'count': 0}
-
-            path = (DATA_DIR / 'eFloras'
-                    / f"{family['family']}_{family['flora_id']}")
-
-            if path.exists():
-                times['count'] = len(list(path.glob('**/treatments/*.html')))
-                if times['count']:
-                    stat = path.stat()
-                    times['created'] = datetime.fromtimestamp(
-                        stat.st_ctime).strftime('%Y-%m-%d %H:%M')
-                    times['modified'] = datetime.fromtimestamp(
-                        stat.st_mtime).strftime('%Y-%m-%d %H:%M')
+            times = {'created': '', 'modified': '', 'count': 0, 'taxa': 0}
+            times |= downloaded.get(key, {})
 
-            key = (family['family'].lower(), int(family['flora_id']))
             families[key] = {**family, **times}
 
     return families
 
 
+def get_taxon_level(family, taxon):
+    """Calculate the taxon level and the genus & species it belongs to."""
+    taxon_parts = taxon.split()
+
+    if taxon == family:
+        level = 'family'
+        genus = ''
+        species = ''
+
+    elif len(taxon_parts) == 1:
+        level = 'genus'
+        genus = taxon_parts[0]
+        species = ''
+
+    elif len(taxon_parts) == 2:
+        level = 'species'
+        genus = taxon_parts[0]
+        species = ' '.join(taxon_parts[:2])
+
+    elif taxon.lower().find('subsp.') > -1:
+        level = 'subspecies'
+        genus = taxon_parts[0]
+        species = ' '.join(taxon_parts[:2])
+
+    elif taxon.lower().find('var.') > -1:
+        level = 'variant'
+        genus = taxon_parts[0]
+        species = ' '.join(taxon_parts[:2])
+
+    elif taxon.lower().find('sect.') > -1:
+        level = 'section'
+        genus = taxon_parts[0]
+        species = ''
+
+    else:
+        raise ValueError(f"Cannot find taxon level in: {taxon}")
+
+    return level, genus, species
+
+
 def get_flora_ids():
     """Get a list of flora IDs."""
     flora_ids = {}
@@ -72,3 +115,86 @@ def get_family_flora_ids(args, families):
     """Get family and flora ID combinations."""
     return [c for c in product(args.family, args.flora_id)
             if c in families]
+
+
+def chunked(iterable, size):
+    """Break an iterable into lists of (at most) the given size."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def fan_out(rows, consumers, maxsize=1000):
+    """Stream every row to each consumer.
+
+    Each consumer is a function that takes an iterable of rows. When there is
+    more than one, each runs in its own thread reading from a bounded queue so
+    only a few rows are ever in memory at once.
+    """
+    if len(consumers) == 1:
+        consumers[0](rows)
+        return
+
+    errors = []
+    queues = [Queue(maxsize) for _ in consumers]
+    threads = [Thread(target=_consume, args=(c, q, errors), daemon=True)
+               for c, q in zip(consumers, queues)]
+
+    for thread in threads:
+        thread.start()
+
+    for row in rows:
+        for queue, thread in zip(queues, threads):
+            _put(queue, thread, row)
+
+    for queue, thread in zip(queues, threads):
+        _put(queue, thread, DONE)
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
+def process_pool(workers):
+    """Make a pool of worker processes, or a stand-in when there is one worker.
+
+    The workers are started by a fork server, not forked from this process,
+    because by the time they start the writer threads are already running and
+    forking a process with threads can deadlock.
+    """
+    if workers <= 1:
+        return nullcontext()
+    context = multiprocessing.get_context('forkserver')
+    return ProcessPoolExecutor(workers, mp_context=context)
+
+
+def submit(pool, func, *args):
+    """Run the function in the process pool or, without a pool, right away.
+
+    Either way the caller gets a future back.
+    """
+    if pool is None:
+        future = Future()
+        future.set_result(func(*args))
+        return future
+    return pool.submit(func, *args)
+
+
+def _consume(consumer, queue, errors):
+    """Run a consumer on the rows coming out of its queue."""
+    try:
+        consumer(iter(queue.get, DONE))
+    except Exception as err:  # pylint: disable=broad-except
+        errors.append(err)
+
+
+def _put(queue, thread, row):
+    """Queue a row unless the consumer has stopped reading."""
+    while thread.is_alive():
+        try:
+            queue.put(row, timeout=1)
+            return
+        except Full:
+            continue
@@ -1,84 +1,233 @@
 """Parse eFloras html pages."""
 
+import hashlib
 import re
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
 
 from bs4 import BeautifulSoup
+from lxml import html
 from traiter.const import FLAGS
 
 import downloader
+import efloras.pylib.const as const
 import efloras.pylib.util as util
-from efloras.pylib.const import PARA_RE
+from efloras.pylib import family_index, manifest, metrics, page_store
 
 TAXON_RE = re.compile(r'Accepted Name', flags=re.IGNORECASE)
 
+READ_CHUNK = 16  # Pages in flight per reader worker
+
 
 def efloras_reader(args, families):
-    """Perform the parsing."""
+    """Perform the parsing.
+
+    Treatments are yielded one at a time in (flora_id, family, taxon) order.
+    Pages that need parsing are read by a pool of processes when there is
+    more than one reader worker.
+    """
     families_flora = util.get_family_flora_ids(args, families)
-    flora_ids = util.get_flora_ids()
+    families_flora = sorted(families_flora, key=lambda c: (c[1], c[0]))
+
+    with util.process_pool(args.reader_workers) as pool:
+        for family_name, flora_id in families_flora:
+            family = families[(family_name, int(flora_id))]
+            yield from read_family(args, family, pool)
+
+
+@lru_cache(maxsize=None)
+def index_version():
+    """The family index is rebuilt when the paragraph filter changes.
+
+    That is the paragraph pattern and the reader code that applies it.
+    """
+    digest = hashlib.sha256()
+    digest.update(const.PARA_RE.pattern.encode())
+    digest.update(Path(__file__).read_bytes())
+    return digest.hexdigest()
+
+
+def read_family(args, family, pool):
+    """Read all of the selected treatments for one family."""
+    flora_id = int(family['flora_id'])
+    flora_name = util.get_flora_ids()[flora_id]
+
+    dir_ = downloader.family_dir(flora_id, family['family'])
+    store = page_store.open_store(dir_, flora_id)
+    cxn = family_index.connect(dir_, index_version())
+    stats = family_index.get_stats(cxn)
+
+    treatments = get_treatments(args, family, cxn, store)
+
+    # Keep a bounded number of pages in flight & yield them in order
+    window = 2 * args.reader_workers * READ_CHUNK
+    pending = deque()
+
+    for treatment in sorted(treatments):
+        with metrics.span('reader.read'):
+            pending.append(
+                read_traits(pool, cxn, stats, treatment, args.reader))
+        while len(pending) > window:
+            yield finish_row(cxn, family, flora_name, pending)
+
+    while pending:
+        yield finish_row(cxn, family, flora_name, pending)
+
+    cxn.commit()
+    cxn.close()
+    store.close()
+
+    # The taxa are counted once the family tree is indexed
+    cxn = manifest.connect()
+    with cxn:
+        manifest.update(cxn, dir_, family['family'], flora_id)
+    cxn.close()
+
+
+def get_treatments(args, family, cxn, store):
+    """Find the treatment pages with a taxon name that passes the filter."""
+    with metrics.span('reader.family_tree'):
+        taxa = get_family_tree(family, cxn, store)
 
     # Build a filter for the taxon names
     genera = [g.lower() for g in args.genus] if args.genus else []
     genera = [r'\s'.join(g.split()) for g in genera]
     genera = '|'.join(genera)
 
-    rows = []
+    treatments = []
+    for page in store.pages('treatment'):
+        taxon_id = downloader.get_taxon_id(page.name)
 
-    for family_name, flora_id in families_flora:
-        flora_id = int(flora_id)
-        family = families[(family_name, flora_id)]
-        taxa = get_family_tree(family)
-        root = downloader.treatment_dir(flora_id, family['family'])
-        for path in root.glob('*.html'):
-            text = get_treatment(path)
-            text = get_traits(text)
-            taxon_id = downloader.get_taxon_id(path)
+        # Must have a taxon name
+        if not taxa.get(taxon_id):
+            continue
 
-            # Must have a taxon name
-            if not taxa.get(taxon_id):
-                continue
+        # Filter on the taxon name
+        if genera and not re.search(genera, taxa[taxon_id], flags=FLAGS):
+            continue
 
-            # Filter on the taxon name
-            if genera and not re.search(genera, taxa[taxon_id], flags=FLAGS):
-                continue
+        treatments.append((taxa[taxon_id], taxon_id, page))
 
-            rows.append({
-                'family': family['family'],
-                'flora_id': flora_id,
-                'flora_name': flora_ids[flora_id],
-                'taxon': taxa[taxon_id],
-                'taxon_id': taxon_id,
-                'link': treatment_link(flora_id, taxon_id),
-                'path': path,
-                'text': text if text else '',
-            })
+    return treatments
 
-    return rows
 
+def finish_row(cxn, family, flora_name, pending):
+    """Build the row for the oldest page in flight."""
+    with metrics.span('reader.finish'):
+        row = build_row(cxn, family, flora_name, *pending.popleft())
+    metrics.count('reader.rows')
+    return row
 
-def get_family_tree(family):
-    """Get all taxa for the all of the families."""
-    taxa = {}
-    tree_dir = downloader.tree_dir(family['flora_id'], family['family'])
-    for path in tree_dir.glob('*.html'):
 
-        with open(path) as in_file:
-            page = in_file.read()
+def build_row(cxn, family, flora_name, treatment, stat, indexed, future):
+    """Build the row for a treatment once its paragraph has been read."""
+    flora_id = int(family['flora_id'])
+    taxon, taxon_id, page = treatment
+    text = future.result()
+
+    if not indexed:
+        family_index.put_treatment(cxn, page.name, taxon_id, stat, text)
+
+    # Put the page's modified date into ISO 8601 format
+    downloaded = datetime.fromtimestamp(stat.st_mtime)
+    downloaded = downloaded.isoformat(sep=' ', timespec='seconds')
+
+    return {
+        'family': family['family'],
+        'flora_id': flora_id,
+        'flora_name': flora_name,
+        'taxon': taxon,
+        'taxon_id': taxon_id,
+        'link': treatment_link(flora_id, taxon_id),
+        'path': str(page),
+        'downloaded': downloaded,
+        'text': text if text else '',
+    }
+
+
+def read_traits(pool, cxn, stats, treatment, backend='bs4'):
+    """Get the trait paragraph from the index or start reading the page.
+
+    Pages that have to be read are added to the index once their new
+    paragraph is found. The page is read here and only parsed by the pool,
+    so the page store is never shared between processes.
+    """
+    page = treatment[2]
+    stat = page.stat()
 
-        soup = BeautifulSoup(page, features='lxml')
+    if family_index.is_current(stats, page.name, stat):
+        metrics.count('reader.pages_indexed')
+        future = util.submit(None, family_index.get_text, cxn, page.name)
+        return treatment, stat, True, future
+
+    metrics.count('reader.pages_parsed')
+    metrics.count('reader.bytes_parsed', stat.st_size)
+    future = util.submit(pool, read_page, page.read_text(), backend)
+    return treatment, stat, False, future
+
+
+def get_family_tree(family, cxn, store):
+    """Get the taxon names for the family keyed by taxon ID.
+
+    The tree pages are only parsed when they have changed since they were
+    last indexed.
+    """
+    signature = store.signature('tree')
+    if not family_index.taxa_are_current(cxn, signature):
+        taxa = parse_family_tree(family, store)
+        family_index.put_taxa(cxn, taxa, signature)
+    return family_index.get_taxon_names(cxn)
+
+
+def parse_family_tree(family, store):
+    """Get all taxa for the family from its tree pages.
+
+    Each tree page lists the children of the taxon it is named after.
+    """
+    flora_id = int(family['flora_id'])
+    family_name = family['family'].capitalize()
+    taxa = {}
+
+    for page in store.pages('tree'):
+        parent_id = downloader.get_taxon_id(page.name)
+        soup = BeautifulSoup(page.read_text(), features='lxml')
 
         for link in soup.findAll('a', attrs={'title': TAXON_RE}):
             href = link.attrs['href']
             taxon_id = downloader.get_taxon_id(href)
-            taxa[taxon_id] = link.text
+            taxon = taxa.setdefault(taxon_id, {
+                'taxon_id': taxon_id,
+                'name': link.text,
+                'parent_id': None,
+                'rank': taxon_rank(family_name, link.text),
+                'flora_id': flora_id,
+            })
+            taxon['name'] = link.text
+            if taxon_id != parent_id:
+                taxon['parent_id'] = parent_id
+
+    return list(taxa.values())
 
-    return taxa
+
+def taxon_rank(family_name, name):
+    """Get the taxon rank from its name, if we can."""
+    try:
+        return util.get_taxon_level(family_name, name.capitalize())[0]
+    except ValueError:
+        return ''
+
+
+def read_page(page, backend='bs4'):
+    """Get the trait paragraph from the HTML of a treatment page."""
+    get_treatment_, get_traits_ = BACKENDS[backend]
+    treatment = get_treatment_(page)
+    return get_traits_(treatment)
 
 
-def get_treatment(path):
+def get_treatment(page):
     """Get the taxon description page."""
-    with open(path) as in_file:
-        page = in_file.read()
     soup = BeautifulSoup(page, features='lxml')
     return soup.find(id='panelTaxonTreatment')
 
@@ -87,19 +236,46 @@ def get_traits(treatment):
     """Find the trait paragraph in the treatment."""
     if not treatment:
         return ''
+    paras = (' '.join(p.get_text().split()) for p in treatment.find_all('p'))
+    return best_paragraph(paras)
+
+
+def get_treatment_lxml(page):
+    """Get the taxon description panel without building a soup."""
+    page = html.fromstring(page)
+    found = page.xpath('//*[@id="panelTaxonTreatment"]')
+    return found[0] if found else None
+
+
+def get_traits_lxml(treatment):
+    """Find the trait paragraph in the treatment panel."""
+    if treatment is None:
+        return ''
+    paras = (' '.join(p.text_content().split())
+             for p in treatment.iterdescendants('p'))
+    return best_paragraph(paras)
+
+
+def best_paragraph(paras):
+    """Pick the paragraph that mentions the most plant parts."""
     best = ''
     high = 0
-    for para in treatment.find_all('p'):
-        text = ' '.join(para.get_text().split())
-        unique = set(PARA_RE.findall(text))
+    for text in paras:
+        unique = set(const.PARA_RE.findall(text))
         if len(unique) > high:
-            best = ' '.join(para.get_text().split())
+            best = text
             high = len(unique)
         if high >= 5:
             return best
     return best if high >= 4 else ''
 
 
+BACKENDS = {
+    'bs4': (get_treatment, get_traits),
+    'lxml': (get_treatment_lxml, get_traits_lxml),
+}
+
+
 def treatment_link(flora_id, taxon_id):
     """Build a link to the treatment page."""
     return ('http://www.efloras.org/florataxon.aspx?'
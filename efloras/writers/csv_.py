@@ -1,28 +1,181 @@
 """Write the output to a CSV file."""
 
-from collections import defaultdict
+import csv
+import pickle
+from collections import Counter, defaultdict
+from tempfile import TemporaryFile
 
-import pandas as pd
+import numpy as np
 
-from efloras.pylib.util import convert
+from efloras.pylib import metrics
+from efloras.pylib.util import CONVERT
 
 
 def csv_writer(args, rows):
-    """Output the data."""
-    rows = sorted(rows, key=lambda r: (r['flora_id'], r['family'], r['taxon']))
+    """Output the data.
 
+    The set of columns is not known until every row has been seen, so the
+    expanded rows are spooled to a temporary file while the column schema
+    is gathered. Then the rows are read back a block at a time into typed
+    columns and written out from those.
+
+    Size measurements are collected into columns for each block of rows and
+    their units are normalized all at once before the block is spooled.
+    """
+    schema = {}
+    filled = Counter()
+    row_count = 0
+
+    with TemporaryFile() as spool:
+        block, sizes = [], size_columns()
+        for row in rows:
+            with metrics.span('csv_writer.build'):
+                view = {k: v for k, v in row.items()
+                        if k not in ('ents', 'sents')}
+                view['raw_traits'] = [e['data'] for e in row['ents']]
+                build_columns(view, sizes, len(block))
+                update_schema(schema, view, filled)
+                block.append(view)
+            metrics.count('csv_writer.rows')
+            metrics.count('csv_writer.traits', len(row['ents']))
+            row_count += 1
+
+            if len(block) >= args.chunk_size:
+                spool_block(spool, block, sizes, schema)
+                block, sizes = [], size_columns()
+
+        spool_block(spool, block, sizes, schema)
+
+        spool.seek(0)
+        widen_ints(schema, filled, row_count)
+
+        with metrics.span('csv_writer.write'):
+            writer = csv.writer(args.csv_file)
+            writer.writerow(schema)
+            views = read_spool(spool)
+            for count, block in column_blocks(views, schema, args.chunk_size):
+                blanks = [''] * count
+                cells = [column_cells(*block[k]) if k in block else blanks
+                         for k in schema]
+                writer.writerows(zip(*cells))
+
+
+def spool_block(spool, block, sizes, schema):
+    """Put a block's normalized sizes into its rows and spool the rows."""
+    with metrics.span('csv_writer.normalize_sizes'):
+        row_nos, keys, values = normalize_sizes(sizes)
+        for row_no, key, value in zip(row_nos, keys, values):
+            block[row_no][key] = value
+        for key in set(keys):
+            schema[key] = column_kind(schema[key], 0.0)
+
+    with metrics.span('csv_writer.build'):
+        for view in block:
+            pickle.dump(view, spool)
+
+
+def read_spool(spool):
+    """Read the rows back from the spool file."""
+    while True:
+        try:
+            yield pickle.load(spool)
+        except EOFError:
+            return
+
+
+BLOCK_CELLS = 1_000_000  # Values filled into typed columns at a time
+
+KINDS = {int: 'int', float: 'float'}
+NUMBERS = {'int', 'float'}
+DTYPES = {'int': np.int64, 'float': np.float64, 'object': object}
+
+
+def column_kind(kind, value):
+    """Widen a column's kind so that it can hold the value.
+
+    Mixed ints & floats become floats, as they did in a data frame.
+    """
+    new = KINDS.get(type(value), 'object')
+    if kind is None or kind == new:
+        return new
+    if kind in NUMBERS and new in NUMBERS:
+        return 'float'
+    return 'object'
+
+
+def update_schema(schema, row, filled=None):
+    """Add a row's columns to the schema in the order they are first seen.
+
+    Missing values (None) add the column without deciding its kind. The
+    values in each column are counted in filled.
+    """
+    for key, value in row.items():
+        kind = schema.get(key)
+        schema[key] = kind if value is None else column_kind(kind, value)
+        if filled is not None and value is not None:
+            filled[key] += 1
+
+
+def widen_ints(schema, filled, row_count):
+    """Make int columns with missing values floats.
+
+    A data frame holds missing values as NaN, so those columns were written
+    as 5.0 and not 5. This keeps that format.
+    """
+    for key, kind in schema.items():
+        if kind == 'int' and filled[key] < row_count:
+            schema[key] = 'float'
+
+
+def column_blocks(rows, schema, block_size, block_cells=BLOCK_CELLS):
+    """Fill preallocated typed columns from blocks of rows.
+
+    Blocks hold at most block_size rows and about block_cells values. Only
+    the columns with a value in the block get arrays: the values and a mask
+    of which rows have a value. This returns the row count and the columns.
+    """
+    for chunk in cell_chunks(rows, block_size, block_cells):
+        keys = {k for row in chunk for k, v in row.items() if v is not None}
+        block = {k: (np.zeros(len(chunk), dtype=DTYPES[kind or 'object']),
+                     np.zeros(len(chunk), dtype=bool))
+                 for k, kind in schema.items() if k in keys}
+        for i, row in enumerate(chunk):
+            for key, value in row.items():
+                if value is not None:
+                    values, present = block[key]
+                    values[i] = value
+                    present[i] = True
+        yield len(chunk), block
+
+
+def cell_chunks(rows, block_size, block_cells):
+    """Break rows into lists limited by row count and by value count."""
+    chunk, cells = [], 0
     for row in rows:
-        row['raw_traits'] = row['traits']
-        del row['traits']
-        del row['doc']
-        build_columns(row)
+        chunk.append(row)
+        cells += len(row)
+        if len(chunk) >= block_size or cells >= block_cells:
+            yield chunk
+            chunk, cells = [], 0
+    if chunk:
+        yield chunk
+
+
+def column_cells(values, present):
+    """Convert a column to CSV cells with blanks for missing values."""
+    return [v if p else '' for v, p in zip(values.tolist(), present.tolist())]
 
-    df = pd.DataFrame(rows)
-    df.to_csv(args.csv_file, index=False)
 
+def build_columns(row, sizes=None, row_no=0):
+    """Expand values into separate columns.
+
+    Size measurements are added to the size columns to be normalized later
+    with the rest of the block's. Without size columns they are normalized
+    here.
+    """
+    own_sizes = sizes is None
+    sizes = size_columns() if own_sizes else sizes
 
-def build_columns(row):
-    """Expand values into separate columns."""
     extras = set(""" sex location group """.split())
     skips = extras | {'start', 'end'}
 
@@ -56,10 +209,14 @@ def build_columns(row):
             value = {v[k] for v in value_list for k in v.keys()}
             row[header] = ', '.join(sorted(value))
         elif header.endswith('_size'):
-            extract_sizes(row, header, value_list)
+            extract_sizes(row, header, value_list, sizes, row_no)
         else:
             extract_traits(row, header, value_list)
 
+    if own_sizes:
+        _, keys, values = normalize_sizes(sizes)
+        row |= dict(zip(keys, values))
+
     return row
 
 
@@ -71,8 +228,12 @@ def extract_traits(row, header, value_list):
             row[key] = value
 
 
-def extract_sizes(row, header, value_list):
-    """Normalize size traits."""
+def extract_sizes(row, header, value_list, sizes, row_no):
+    """Add size traits to the size columns to be normalized later.
+
+    The row gets a placeholder for each measurement so the column order is
+    the same as when the values were filled in here.
+    """
     for i, extract in enumerate(value_list, 1):
 
         length_units = extract.get('length_units', extract.get('width_units'))
@@ -86,9 +247,46 @@ def extract_sizes(row, header, value_list):
             if len(parts) > 1 and parts[1] == 'units':
                 row[key] = value
             elif parts[0] == 'length':
-                row[key] = convert(value, length_units)
+                add_size(row, sizes, row_no, key, value, length_units)
             elif parts[0] == 'width':
-                row[key] = convert(value, width_units)
+                add_size(row, sizes, row_no, key, value, width_units)
             elif parts[0].endswith('units'):
                 units = f'{parts[0]}_units'
-                row[key] = convert(value, extract.get(units))
+                add_size(row, sizes, row_no, key, value, extract.get(units))
+
+
+def size_columns():
+    """Make empty columns for size measurements.
+
+    Units are stored as small integer codes into the units list.
+    """
+    return {'row_no': [], 'key': [], 'value': [], 'unit': [], 'units': {}}
+
+
+def add_size(row, sizes, row_no, key, value, units):
+    """Add a size measurement to the columns.
+
+    Sizes must be numbers, as the size patterns make them. Anything else is
+    an error here, while the row is built, rather than once every row has
+    been spooled.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f'{key} is not a number: {value!r}')
+    row[key] = None
+    sizes['row_no'].append(row_no)
+    sizes['key'].append(key)
+    sizes['value'].append(value)
+    sizes['unit'].append(sizes['units'].setdefault(units, len(sizes['units'])))
+
+
+def normalize_sizes(sizes):
+    """Convert every size measurement in the columns to millimeters at once.
+
+    This returns the row numbers, column keys, and normalized values in the
+    order they were added.
+    """
+    factors = np.array(
+        [CONVERT.get(u, 1.0) for u in sizes['units']] or [1.0], dtype=np.float64)
+    values = np.array(sizes['value'], dtype=np.float64)
+    values *= factors[np.array(sizes['unit'], dtype=np.intp)]
+    return sizes['row_no'], sizes['key'], values.tolist()
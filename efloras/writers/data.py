@@ -26,13 +26,15 @@ LABELS = set()
 #             LABELS.add(tuple(label))
 
 
-def get_entities(sent):
+def get_entities(row, sent_start, sent_end):
     """Convert traits in a sentence to entity offsets."""
     entities = []
-    for entity in sent.ents:
-        start = entity.start_char - sent.start_char
-        end = entity.end_char - sent.start_char
-        entity_offset = (start, end, entity.label_)
+    for entity in row['ents']:
+        if entity['start'] < sent_start or entity['end'] > sent_end:
+            continue
+        start = entity['start'] - sent_start
+        end = entity['end'] - sent_start
+        entity_offset = (start, end, entity['label'])
         entities.append(entity_offset)
     return entities
 
@@ -41,9 +43,9 @@ def ner_writer(args, rows):
     """Output named entity recognition training data."""
     # _get_labels()
     for row in rows:
-        for sent in row['doc'].sents:
-            entities = get_entities(sent)
-            line = json.dumps([sent.text, {'entities': entities}])
+        for start, end in row['sents']:
+            entities = get_entities(row, start, end)
+            line = json.dumps([row['text'][start:end], {'entities': entities}])
             args.ner_file.write(line)
             args.ner_file.write('\n')
 
@@ -4,11 +4,27 @@ from pathlib import Path
 
 import duckdb
 
-from efloras.writers.sqlite3_db import get_raw_traits, get_sources, get_taxa, get_traits
+from efloras.pylib import metrics
+from efloras.pylib.util import chunked
+from efloras.writers.sqlite3_db import (
+    get_raw_traits, get_sources, get_taxa, get_traits, text_digest)
+
+FETCH_SIZE = 10_000  # Sources read at a time
+
+TABLES = {
+    'source_df': 'sources',
+    'taxon_df': 'taxa',
+    'trait_df': 'traits',
+    'field_df': 'fields',
+}
 
 
 def duck_db(args, rows):
-    """Write data to a duck_db."""
+    """Write data to a duck_db.
+
+    Rows are written in chunks so the whole extraction never has to be held
+    in memory.
+    """
     path = Path(args.duckdb)
 
     if args.clear_db:
@@ -18,43 +34,70 @@ def duck_db(args, rows):
 
     create_tables(cxn)
 
-    source_df = get_sources(rows)
-    cxn.register('source_df', source_df)
+    for chunk in chunked(rows, args.chunk_size):
+        with metrics.span('duckdb.insert'):
+            insert_chunk(cxn, chunk)
+        metrics.count('duckdb.rows_inserted', len(chunk))
 
-    taxon_df = get_taxa(rows, cxn)
-    cxn.register('taxon_df', taxon_df)
+    cxn.close()
+
+
+def loaded_texts(path):
+    """Get a digest of the treatment text already loaded for each source ID.
+
+    This must be called before the duck_db writer opens the database.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+
+    cxn = duckdb.connect(str(path))
+    create_tables(cxn)
+
+    texts = {}
+    sql = """SELECT source_id, text_ FROM sources WHERE source_id > ?
+              ORDER BY source_id LIMIT ?;"""
+    last_id = -1
+    while batch := cxn.execute(sql, [last_id, FETCH_SIZE]).fetchall():
+        texts |= {i: text_digest(t) for i, t in batch}
+        last_id = batch[-1][0]
+
+    cxn.close()
+    return texts
 
-    raw_traits = get_raw_traits(rows, cxn)
 
+def insert_chunk(cxn, rows):
+    """Replace the records for a chunk of rows."""
+    source_df = get_sources(rows)
+    taxon_df = get_taxa(rows, cxn)
+    raw_traits = get_raw_traits(rows, cxn)
     trait_df, field_df = get_traits(raw_traits)
-    cxn.register('trait_df', trait_df)
-    cxn.register('field_df', field_df)
+    metrics.count('duckdb.traits_inserted', len(trait_df))
+
+    views = {'source_df': source_df, 'taxon_df': taxon_df,
+             'trait_df': trait_df, 'field_df': field_df}
+    views = {k: v for k, v in views.items() if not v.empty}
+
+    for name, df in views.items():
+        cxn.register(name, df)
 
     delete_old_recs(cxn)
-    inset_new_recs(cxn)
+    inset_new_recs(cxn, views)
 
-    drop_views(cxn)
-    cxn.close()
+    drop_views(cxn, views)
 
 
-def drop_views(cxn):
+def drop_views(cxn, views):
     """Remove data frame views."""
-    cxn.unregister('source_df')
-    cxn.unregister('taxon_df')
-    cxn.unregister('trait_df')
-    cxn.unregister('field_df')
-    cxn.execute('DROP VIEW source_df;')
-    cxn.execute('DROP VIEW taxon_df;')
-    cxn.execute('DROP VIEW trait_df;')
-    cxn.execute('DROP VIEW field_df;')
+    for name in views:
+        cxn.unregister(name)
+        cxn.execute(f'DROP VIEW {name};')
 
 
-def inset_new_recs(cxn):
+def inset_new_recs(cxn, views):
     """Add the new data."""
-    cxn.execute("""INSERT INTO sources SELECT * FROM source_df;""")
-    cxn.execute("""INSERT INTO taxa SELECT * FROM taxon_df;""")
-    cxn.execute("""INSERT INTO traits SELECT * FROM trait_df;""")
-    cxn.execute("""INSERT INTO fields SELECT * FROM field_df;""")
+    for name in views:
+        cxn.execute(f'INSERT INTO {TABLES[name]} SELECT * FROM {name};')
 
 
 def delete_old_recs(cxn):
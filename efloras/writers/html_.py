@@ -7,6 +7,8 @@ from itertools import cycle
 
 from jinja2 import Environment, FileSystemLoader
 
+from efloras.pylib import metrics
+
 COLOR_COUNT = 14
 BACKGROUNDS = cycle([f'c{i}' for i in range(COLOR_COUNT)])
 BORDERS = cycle([f'b{i}' for i in range(COLOR_COUNT)])
@@ -15,62 +17,66 @@ SKIPS = {'start', 'end', 'trait', 'part', 'subpart'}
 
 
 def html_writer(args, rows):
-    """Output the data."""
-    rows = sorted(rows, key=lambda r: (
-        r.get('flora_id'), r['family'], r['taxon']))
-
-    for row in rows:
-        row['traits'] = [e._.data for e in row['doc'].ents]
+    """Output the data.
 
-    classes = build_classes(rows)
+    Rows are formatted as the template renders them, so the page is
+    streamed to the file instead of being built in memory.
+    """
+    classes = {
+        'part': 'bold',
+        'subpart': 'bold-italic',
+    }
+    backgrounds = {}
+    borders = {}
 
-    for row in rows:
-        row['raw_text'] = row['text']
-        row['text'] = format_text(row, classes)
-        row['traits'] = format_traits(row, classes)
+    def views():
+        for row in rows:
+            with metrics.span('html_writer.format'):
+                view = {**row, 'traits': [e['data'] for e in row['ents']]}
+                build_classes(view, classes, backgrounds, borders)
+                view['raw_text'] = view['text']
+                view['text'] = format_text(view, classes)
+                view['traits'] = format_traits(view, classes)
+            metrics.count('html_writer.rows')
+            metrics.count('html_writer.traits', len(row['ents']))
+            yield view
 
     env = Environment(
         loader=FileSystemLoader('./efloras/writers/templates'),
         autoescape=True)
 
-    template = env.get_template('html_.html').render(
+    template = env.get_template('html_.html').stream(
         now=datetime.strftime(datetime.now(), '%Y-%m-%d %H:%M'),
-        rows=rows)
-    args.html_file.write(template)
+        rows=views())
+    template.dump(args.html_file)
     args.html_file.close()
 
 
-def build_classes(rows):
+def build_classes(row, tags, backgrounds, borders):
     """Make tags for HTML text color highlighting.
 
     Tag keys are the trait name and if it's an open or close tag.
     For example:
         (trait_name, is_open) -> <span class="css_class">
         (trait_name, not_open) -> </span>
-    """
-    backgrounds = {}
-    borders = {}
 
-    tags = {
-        'part': 'bold',
-        'subpart': 'bold-italic',
-    }
-
-    for row in rows:
-        for trait in row['traits']:
-            if trait['trait'] in {'part', 'subpart'}:
-                continue
-            if 'part' not in trait:
-                continue
-            name = trait_label(trait, '_')
-            name_parts = name.split('_')
-            bg, border = name_parts[0], name_parts[-1]
-            if bg not in backgrounds:
-                backgrounds[bg] = next(BACKGROUNDS)
-            if border not in borders:
-                borders[border] = next(BORDERS)
-            classes = f'{backgrounds[bg]} {borders[border]} c{backgrounds[bg]}'
-            tags[name] = classes
+    The tags, backgrounds, and borders are updated in place so colors stay
+    the same from one row to the next.
+    """
+    for trait in row['traits']:
+        if trait['trait'] in {'part', 'subpart'}:
+            continue
+        if 'part' not in trait:
+            continue
+        name = trait_label(trait, '_')
+        name_parts = name.split('_')
+        bg, border = name_parts[0], name_parts[-1]
+        if bg not in backgrounds:
+            backgrounds[bg] = next(BACKGROUNDS)
+        if border not in borders:
+            borders[border] = next(BORDERS)
+        classes = f'{backgrounds[bg]} {borders[border]} c{backgrounds[bg]}'
+        tags[name] = classes
     return tags
 
 
@@ -0,0 +1,196 @@
+"""Write the trait tables to Parquet files."""
+
+import shutil
+from collections import Counter, OrderedDict, defaultdict
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from efloras.pylib import metrics
+from efloras.pylib.util import chunked
+from efloras.writers.sqlite3_db import number_traits, source_id, trait_records
+
+PARTITIONS = ['flora_id', 'family']
+GROUP_ROWS = 100_000  # Rows buffered for a partition before writing them
+MAX_OPEN = 32  # Partition files kept open at once
+
+SCHEMAS = {
+    'traits': pa.schema([
+        ('trait_id', pa.int64()),
+        ('source_id', pa.int64()),
+        ('trait', pa.string()),
+        ('taxon', pa.string()),
+        ('part', pa.string()),
+        ('sex', pa.string()),
+        ('notes', pa.string()),
+        ('flora_id', pa.int64()),
+        ('family', pa.string()),
+    ]),
+    'fields': pa.schema([
+        ('trait_id', pa.int64()),
+        ('source_id', pa.int64()),
+        ('field', pa.string()),
+        ('value', pa.string()),
+        ('number', pa.float64()),
+        ('flora_id', pa.int64()),
+        ('family', pa.string()),
+    ]),
+}
+
+
+def parquet_writer(args, rows):
+    """Write the traits & fields tables to Parquet files.
+
+    Each chunk of rows becomes a row group in traits.parquet and
+    fields.parquet. When partitioned, the tables go into flora_id/family
+    directories instead, one file per partition.
+    """
+    root = Path(args.parquet)
+    clear(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    if args.partition:
+        writers = {k: PartitionedTable(root / k, v) for k, v in SCHEMAS.items()}
+    else:
+        writers = {k: TableWriter(root / f'{k}.parquet', v)
+                   for k, v in SCHEMAS.items()}
+
+    last_id = 0
+    for chunk in chunked(rows, args.chunk_size):
+        with metrics.span('parquet.write'):
+            records, last_id = build_records(chunk, last_id)
+            for name, writer in writers.items():
+                writer.write(records[name])
+        metrics.count('parquet.rows_written', len(chunk))
+        metrics.count('parquet.traits_written', len(records['traits']))
+
+    with metrics.span('parquet.write'):
+        for writer in writers.values():
+            writer.close()
+
+
+def clear(root):
+    """Remove the output of an earlier run."""
+    for name in SCHEMAS:
+        shutil.rmtree(root / name, ignore_errors=True)
+        (root / f'{name}.parquet').unlink(missing_ok=True)
+
+
+def build_records(rows, last_id):
+    """Build the trait & field records for a chunk of rows.
+
+    Values are kept as they were parsed, not as a data frame would coerce
+    them. This returns the records and the last trait ID used.
+    """
+    raw_traits = number_traits(rows, last_id)
+    last_id += sum(len(r['ents']) for r in rows)
+    traits, fields = trait_records(raw_traits)
+
+    origins = {source_id(r): {'flora_id': r['flora_id'], 'family': r['family']}
+               for r in rows}
+
+    for trait in traits:
+        trait |= origins[trait['source_id']]
+
+    for field in fields:
+        field |= origins[field['source_id']]
+        field['number'] = to_number(field['value'])
+        field['value'] = to_text(field['value'])
+
+    return {'traits': traits, 'fields': fields}, last_id
+
+
+def to_text(value):
+    """Format a field value as text."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+def to_number(value):
+    """Keep numeric values as numbers."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def arrow_table(records, schema):
+    """Convert records into an Arrow table with the schema's columns."""
+    columns = {n: [r.get(n) for r in records] for n in schema.names}
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+class TableWriter:
+    """Write a table to a single Parquet file."""
+
+    def __init__(self, path, schema):
+        self.schema = schema
+        self.writer = pq.ParquetWriter(str(path), schema)
+
+    def write(self, records):
+        """Write the records as a row group."""
+        if records:
+            self.writer.write_table(arrow_table(records, self.schema))
+
+    def close(self):
+        """Finish the file."""
+        self.writer.close()
+
+
+class PartitionedTable:
+    """Write a table to flora_id=<id>/family=<family> directories.
+
+    Records are buffered for each partition and written out as large row
+    groups. Only a few files are kept open and a partition that comes back
+    after its file was closed gets another file.
+    """
+
+    def __init__(self, root, schema):
+        self.root = root
+        self.schema = pa.schema(
+            [f for f in schema if f.name not in PARTITIONS])
+        self.buffers = defaultdict(list)
+        self.writers = OrderedDict()
+        self.files = Counter()
+
+    def write(self, records):
+        """Buffer the records & write the partitions that have filled up."""
+        for record in records:
+            key = tuple(record[p] for p in PARTITIONS)
+            self.buffers[key].append(record)
+        for key in [k for k, v in self.buffers.items() if len(v) >= GROUP_ROWS]:
+            self.flush(key)
+
+    def flush(self, key):
+        """Write a partition's buffered records as a row group."""
+        records = self.buffers.pop(key)
+        self.writer(key).write_table(arrow_table(records, self.schema))
+
+    def writer(self, key):
+        """Get the open file for a partition, opening a new one if needed."""
+        if key in self.writers:
+            self.writers.move_to_end(key)
+            return self.writers[key]
+
+        if len(self.writers) >= MAX_OPEN:
+            _, writer = self.writers.popitem(last=False)
+            writer.close()
+
+        flora_id, family = key
+        path = self.root / f'flora_id={flora_id}' / f'family={family}'
+        path.mkdir(parents=True, exist_ok=True)
+        path /= f'part-{self.files[key]}.parquet'
+        self.files[key] += 1
+
+        self.writers[key] = pq.ParquetWriter(str(path), self.schema)
+        return self.writers[key]
+
+    def close(self):
+        """Write what is left and finish every file."""
+        for key in list(self.buffers):
+            self.flush(key)
+        for writer in self.writers.values():
+            writer.close()
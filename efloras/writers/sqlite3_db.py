@@ -1,17 +1,22 @@
-"""Write data to a duck_db."""
+"""Write data to a sqlite3 database."""
 
-import os
+import hashlib
 import sqlite3
-from datetime import datetime
 from pathlib import Path
 
 import pandas as pd
 
+from efloras.pylib import metrics
 from efloras.pylib.const import SITE
+from efloras.pylib.util import chunked, get_taxon_level
 
 
 def sqlite3_db(args, rows):
-    """Write data to a duck_db."""
+    """Write data to a sqlite3 database.
+
+    Rows are written in chunks so the whole extraction never has to be held
+    in memory.
+    """
     path = Path(args.sqlite3)
 
     if args.clear_db:
@@ -21,23 +26,60 @@ def sqlite3_db(args, rows):
 
     create_tables(cxn)
 
+    for chunk in chunked(rows, args.chunk_size):
+        with metrics.span('sqlite3.insert'):
+            insert_chunk(cxn, chunk)
+        metrics.count('sqlite3.rows_inserted', len(chunk))
+
+    cxn.close()
+
+
+def loaded_texts(path):
+    """Get a digest of the treatment text already loaded for each source ID.
+
+    Digests keep this small enough to read before the writers start.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+
+    cxn = sqlite3.connect(str(path))
+    create_tables(cxn)
+
+    sql = 'SELECT source_id, text_ FROM sources;'
+    texts = {i: text_digest(t) for i, t in cxn.execute(sql)}
+
+    cxn.close()
+    return texts
+
+
+def text_digest(text):
+    """Digest a treatment's text to tell if it has changed."""
+    return hashlib.blake2b((text or '').encode(), digest_size=16).digest()
+
+
+def insert_chunk(cxn, rows):
+    """Replace the records for a chunk of rows."""
     source_df = get_sources(rows)
     taxon_df = get_taxa(rows, cxn)
     raw_traits = get_raw_traits(rows, cxn)
     trait_df, field_df = get_traits(raw_traits)
+    metrics.count('sqlite3.traits_inserted', len(trait_df))
 
-    delete_old_recs(cxn)
-
-    source_df.to_sql('sources', cxn, if_exists='append', index=False)
-    taxon_df.to_sql('taxa', cxn, if_exists='append', index=False)
-    trait_df.to_sql('traits', cxn, if_exists='append', index=False)
-    field_df.to_sql('fields', cxn, if_exists='append', index=False)
+    delete_old_recs(cxn, source_df)
 
-    cxn.close()
+    for table, df in [('sources', source_df), ('taxa', taxon_df),
+                      ('traits', trait_df), ('fields', field_df)]:
+        if not df.empty:
+            df.to_sql(table, cxn, if_exists='append', index=False)
 
 
-def delete_old_recs(cxn):
+def delete_old_recs(cxn, source_df):
     """Remove old records before inserting new ones."""
+    cxn.execute('DELETE FROM source_ids;')
+    cxn.executemany(
+        'INSERT INTO source_ids (source_id) VALUES (?);',
+        [(int(i),) for i in source_df['source_id']])
     cxn.executescript("""
         DELETE FROM sources WHERE source_id IN (SELECT source_id FROM source_ids);
         DELETE FROM traits WHERE source_id IN (SELECT source_id FROM source_ids);
@@ -47,6 +89,16 @@ def delete_old_recs(cxn):
 
 def get_traits(raw_traits):
     """Build traits data frame."""
+    trait_df, field_df = trait_records(raw_traits)
+
+    trait_df = pd.DataFrame(trait_df)
+    field_df = pd.DataFrame(field_df)
+
+    return trait_df, field_df
+
+
+def trait_records(raw_traits):
+    """Build the trait & field records."""
     trait_df = []
     field_df = []
 
@@ -74,9 +126,6 @@ def get_traits(raw_traits):
             else:
                 append_value(field_df, trait, field, value)
 
-    trait_df = pd.DataFrame(trait_df)
-    field_df = pd.DataFrame(field_df)
-
     return trait_df, field_df
 
 
@@ -95,29 +144,27 @@ def append_value(field_df, trait, field, value):
 
 def get_raw_traits(rows, cxn):
     """Create traits data frame."""
+    return number_traits(rows, get_max_trait_id(cxn))
+
+
+def number_traits(rows, next_id=0):
+    """Give every entity a trait ID after the given one & link them up."""
     traits = []
-    next_id = get_max_trait_id(cxn)
 
     for row in rows:
-        all_ents = {}
-
-        # Create an ID and key entities by their span start & end characters
-        for ent in row['doc'].ents:
+        # Create an ID for each entity
+        ids = []
+        for _ in row['ents']:
             next_id += 1
-            all_ents[(ent.start_char, ent.end_char)] = {
-                'id': next_id,
-                'data': ent._.data,
-                'links': dict(ent._.links),  # Links are by token indices
-            }
-
-        # Convert entity indices into trait IDs & append it to the list
-        for ent in all_ents.values():
-            link_ids = {k: all_ents[i]['id']
-                        for k, v in ent['links'].items() for i in v}
+            ids.append(next_id)
+
+        # Convert entity links into trait IDs & append it to the list
+        for ent, trait_id in zip(row['ents'], ids):
+            link_ids = {k: ids[i] for k, v in ent['links'].items() for i in v}
             traits.append(
                 ent['data'] | link_ids | {
-                    'trait_id': ent['id'],
-                    'source_id': row['source_id'],
+                    'trait_id': trait_id,
+                    'source_id': source_id(row),
                     'taxon': row['taxon'],
                 })
 
@@ -160,72 +207,29 @@ def get_taxa(rows, cxn):
     return df
 
 
-def get_taxon_level(family, taxon):
-    """Calculate the taxon level and any """
-    taxon_parts = taxon.split()
-
-    if taxon == family:
-        level = 'family'
-        genus = ''
-        species = ''
-
-    elif len(taxon_parts) == 1:
-        level = 'genus'
-        genus = taxon_parts[0]
-        species = ''
-
-    elif len(taxon_parts) == 2:
-        level = 'species'
-        genus = taxon_parts[0]
-        species = ' '.join(taxon_parts[:2])
-
-    elif taxon.lower().find('subsp.') > -1:
-        level = 'subspecies'
-        genus = taxon_parts[0]
-        species = ' '.join(taxon_parts[:2])
-
-    elif taxon.lower().find('var.') > -1:
-        level = 'variant'
-        genus = taxon_parts[0]
-        species = ' '.join(taxon_parts[:2])
-
-    elif taxon.lower().find('sect.') > -1:
-        level = 'section'
-        genus = taxon_parts[0]
-        species = ''
-
-    else:
-        raise ValueError(f"Cannot find taxon level in: {taxon}")
-
-    return level, genus, species
-
-
 def get_sources(rows):
     """Build sources data frame."""
     df = []
     for row in rows:
-        # Put the file modified date into ISO 8601 format.
-        downloaded = os.stat(row['path']).st_mtime
-        downloaded = datetime.fromtimestamp(downloaded)
-        downloaded = downloaded.isoformat(sep=' ', timespec='seconds')
-
-        source_id = row['taxon_id'] * 1000 + row['flora_id']
-
         source = {
-            'source_id': source_id,
+            'source_id': source_id(row),
             'source': SITE,
             'url': row['link'],
             'text_': row['text'],
-            'downloaded': downloaded,
+            'downloaded': row['downloaded'],
             'notes': f"{row['family']}, {row['flora_name']}, {row['taxon']}"
         }
         df.append(source)
-        row['source_id'] = source_id
 
     df = pd.DataFrame(df)
     return df
 
 
+def source_id(row):
+    """Build a source ID from the taxon & flora IDs."""
+    return row['taxon_id'] * 1000 + row['flora_id']
+
+
 def create_tables(cxn):
     """Create tables and indices."""
     cxn.executescript("""
@@ -4,57 +4,88 @@
 import argparse
 import sys
 import textwrap
-from copy import deepcopy
+from functools import partial
 
 import efloras.pylib.util as util
-from efloras.pylib.pipeline import pipeline
+from efloras.pylib import metrics, pipe_timer
+from efloras.pylib.records import parse
 from efloras.pylib.util import get_family_flora_ids
 from efloras.readers.efloras import efloras_reader
 from efloras.writers.csv_ import csv_writer
 from efloras.writers.data import biluo_writer, iob_writer, ner_writer
 from efloras.writers.duck_db import duck_db
+from efloras.writers.duck_db import loaded_texts as duck_db_texts
 from efloras.writers.html_ import html_writer
-from efloras.writers.sqlite3_db import sqlite3_db
+from efloras.writers.parquet import parquet_writer
+from efloras.writers.sqlite3_db import loaded_texts as sqlite3_texts
+from efloras.writers.sqlite3_db import source_id, sqlite3_db, text_digest
 
 
 def main(args):
     """Perform actions based on the arguments."""
-    nlp = pipeline()
-    # sent_pipe = sent_pipeline()
     families = get_efloras_families(args)
 
     rows = efloras_reader(args, families)
-
+    if args.incremental:
+        rows = changed_rows(args, rows)
+    timings = {} if args.profile is not None else None
+    rows = parse(args, rows, timings)
+
+    try:
+        with metrics.span('extract'):
+            util.fan_out(rows, get_writers(args))
+
+        if timings is not None:
+            pipe_timer.report(timings, args.profile)
+
+    finally:
+        # Write what was measured even when the run fails
+        if args.metrics:
+            metrics.write(args.metrics, args.metrics_format)
+
+
+def changed_rows(args, rows):
+    """Only pass on treatments that are new or changed in a database.
+
+    A treatment is unchanged when its trait paragraph is already loaded for
+    its source ID in every database being written. What is loaded is read
+    here, before the database writers open their own connections.
+    """
+    databases = [
+        (args.sqlite3, sqlite3_texts),
+        (args.duckdb, duck_db_texts),
+    ]
+    loaded = [f(db) for db, f in databases if db]
+    return new_rows(rows, loaded)
+
+
+def new_rows(rows, loaded):
+    """Filter out the rows whose text is already loaded everywhere."""
+    total, changed = 0, 0
     for row in rows:
-        row['doc'] = nlp(row['text'])
-
-    if args.csv_file:
-        copied = deepcopy(rows)
-        csv_writer(args, copied)
-
-    if args.html_file:
-        copied = deepcopy(rows)
-        html_writer(args, copied)
-
-    if args.ner_file:
-        copied = deepcopy(rows)
-        ner_writer(args, copied)
-
-    if args.iob_file:
-        copied = deepcopy(rows)
-        iob_writer(args, copied)
-
-    if args.biluo_file:
-        copied = deepcopy(rows)
-        biluo_writer(args, copied)
-
-    if args.sqlite3:
-        copied = deepcopy(rows)
-        sqlite3_db(args, copied)
-
-    if args.duckdb:
-        copied = deepcopy(rows)
-        duck_db(args, copied)
+        total += 1
+        digest = text_digest(row['text'])
+        if any(texts.get(source_id(row)) != digest for texts in loaded):
+            changed += 1
+            yield row
+
+    print(f'{changed} of {total} treatments are new or changed.',
+          file=sys.stderr)
+
+
+def get_writers(args):
+    """Get a writer for every output requested."""
+    writers = [
+        (args.csv_file, csv_writer),
+        (args.html_file, html_writer),
+        (args.ner_file, ner_writer),
+        (args.iob_file, iob_writer),
+        (args.biluo_file, biluo_writer),
+        (args.sqlite3, sqlite3_db),
+        (args.duckdb, duck_db),
+        (args.parquet, parquet_writer),
+    ]
+    return [partial(w, args) for output, w in writers if output]
 
 
 def get_efloras_families(args):
@@ -98,7 +129,7 @@ def check_family_flora_ids(args, families):
 
 def print_families(families):
     """Display a list of all families."""
-    template = '{:<20} {:>8} {:>8} {:<30}  {:<20} {:<20} {:>8}'
+    template = '{:<20} {:>8} {:>8} {:<30}  {:<20} {:<20} {:>10} {:>8}'
 
     print(template.format(
         'Family',
@@ -107,7 +138,8 @@ def print_families(families):
         'Flora Name',
         'Directory Created',
         'Directory Modified',
-        'Treatments'))
+        'Treatments',
+        'Taxa'))
 
     for family in families.values():
         print(template.format(
@@ -117,7 +149,8 @@ def print_families(families):
             family['flora_name'],
             family['created'],
             family['modified'],
-            family['count'] if family['count'] else ''))
+            family['count'] if family['count'] else '',
+            family['taxa'] if family['taxa'] else ''))
 
 
 def parse_args():
@@ -144,6 +177,16 @@ def parse_args():
         choices=[str(k) for k in flora_ids],
         help="""Which flora ID to extract. Default 1.""")
 
+    arg_parser.add_argument(
+        '--reader', choices=['bs4', 'lxml'], default='bs4',
+        help="""How to parse the treatment pages. Both give the same text
+            but lxml is faster. (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--reader-workers', type=int, default=1,
+        help="""How many processes to use for reading treatment pages.
+            (default: %(default)s)""")
+
     arg_parser.add_argument(
         '--html-file', '-H', type=argparse.FileType('w'),
         help="""Output the results to this HTML file.""")
@@ -154,6 +197,15 @@ def parse_args():
     arg_parser.add_argument(
         '--duckdb', '-D', help="""Output to this duckDB database.""")
 
+    arg_parser.add_argument(
+        '--parquet', '-P', metavar='DIR',
+        help="""Output the traits and fields tables as Parquet files in
+            this directory. Files from an earlier run are replaced.""")
+
+    arg_parser.add_argument(
+        '--partition', action='store_true',
+        help="""Partition the Parquet tables by flora_id and family.""")
+
     arg_parser.add_argument(
         '--csv-file', '-C', type=argparse.FileType('w'),
         help="""Output the results to this CSV file.""")
@@ -180,6 +232,59 @@ def parse_args():
         '--clear-db', action='store_true',
         help="""Clear the duck_db before writing to it.""")
 
+    arg_parser.add_argument(
+        '--incremental', action='store_true',
+        help="""Only parse and write the treatments that are new or have
+            changed since they were loaded into the sqlite3 or duckDB
+            database. Other outputs will only get those treatments. Run
+            without this option after changing the trait patterns.""")
+
+    arg_parser.add_argument(
+        '--batch-size', type=int, default=100,
+        help="""How many treatments to send through the spaCy pipeline at
+            a time. (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--workers', type=int, default=1,
+        help="""How many processes to use for parsing treatments.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--chunk-size', type=int, default=1000,
+        help="""How many treatments the database, CSV, and Parquet writers
+            handle at a time.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--pipeline', choices=['full', 'minimal'], default='full',
+        help="""Which spaCy pipeline profile to parse with. "minimal" leaves
+            out the model components the trait patterns do not use and is
+            faster. (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--profile', nargs='?', const='', metavar='JSON_FILE',
+        help="""Time each spaCy pipeline component and report its wall time,
+            docs/sec, and tokens/sec at the end of the run. The report is
+            printed as a table or, given a file name, written as JSON.
+            Treatments found in the parse cache are not timed so use this
+            with --no-cache to time everything.""")
+
+    arg_parser.add_argument(
+        '--metrics', metavar='FILE',
+        help="""Write counts and elapsed times for the reader, the parser,
+            and each writer to this file at the end of the run.""")
+
+    arg_parser.add_argument(
+        '--metrics-format', choices=['log', 'prometheus'], default='log',
+        help="""Write the metrics as structured log lines with one JSON
+            object per metric, or as a Prometheus text file.
+            (default: %(default)s)""")
+
+    arg_parser.add_argument(
+        '--no-cache', action='store_true',
+        help="""Parse every treatment again instead of using the records
+            saved in the parse cache.""")
+
     args = arg_parser.parse_args()
 
     if args.family:
@@ -192,8 +297,30 @@ def parse_args():
     else:
         args.flora_id = [1]
 
+    if args.batch_size < 1:
+        sys.exit('--batch-size must be a positive integer.')
+
+    if args.workers < 1:
+        sys.exit('--workers must be a positive integer.')
+
+    if args.reader_workers < 1:
+        sys.exit('--reader-workers must be a positive integer.')
+
+    if args.chunk_size < 1:
+        sys.exit('--chunk-size must be a positive integer.')
+
+    if args.incremental and not (args.sqlite3 or args.duckdb):
+        sys.exit('--incremental needs a --sqlite3 or --duckdb database.')
+
+    if args.partition and not args.parquet:
+        sys.exit('--partition needs a --parquet directory.')
+
+    if args.incremental and args.clear_db:
+        sys.exit('--incremental cannot be used with --clear-db.')
+
     if not (args.csv_file or args.html_file or args.ner_file or args.iob_file
-            or args.biluo_file or args.sqlite3 or args.duckdb):
+            or args.biluo_file or args.sqlite3 or args.duckdb
+            or args.parquet):
         setattr(args, 'csv_file', sys.stdout)
 
     return args
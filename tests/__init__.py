@@ -0,0 +1,9 @@
+"""Tests for the eFloras trait extraction."""
+
+import os
+import tempfile
+
+# Keep the compiled terms the tests build out of the data directory
+TERM_DIR = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+os.environ.setdefault(
+    'EFLORAS_TERM_CACHE', os.path.join(TERM_DIR.name, 'terms.pickle'))
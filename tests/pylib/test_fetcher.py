@@ -0,0 +1,229 @@
+"""Test the page downloader against a local stand-in for eFloras."""
+
+# pylint: disable=missing-function-docstring
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from efloras.pylib.fetcher import FetchError, Fetcher, TokenBucket, file_validators
+
+PAGES = {
+    '/florataxon.aspx?flora_id=1&taxon_id=10': b'<html>treatment 10</html>',
+    '/florataxon.aspx?flora_id=1&taxon_id=11': b'<html>treatment 11</html>',
+    '/florataxon.aspx?flora_id=1&taxon_id=12': b'<html>treatment 12</html>',
+    '/browse.aspx?flora_id=1&start_taxon_id=10': b'<html>tree 10</html>',
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serve saved pages and fail on request."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        server = self.server
+        with server.lock:
+            server.hits.append(self.path)
+            server.clients.add(self.client_address)
+            fail = server.failures.get(self.path, 0)
+            if fail:
+                server.failures[self.path] = fail - 1
+
+        if fail:
+            self.reply(503, b'busy')
+        elif self.path == '/moved':
+            self.send_response(301)
+            self.send_header('Location', '/florataxon.aspx?flora_id=1&taxon_id=10')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path in PAGES:
+            body = PAGES[self.path]
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            else:
+                self.reply(200, body, etag)
+        else:
+            self.reply(404, b'not found')
+
+    def reply(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html')
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class ServerTestCase(unittest.TestCase):
+    """Run a local stand-in for the eFloras site."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.lock = threading.Lock()
+        self.server.hits = []
+        self.server.clients = set()
+        self.server.failures = {}
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.site = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fetcher(self, **kwargs):
+        args = {'rate': 1000.0, 'burst': 10, 'backoff': 0.01, 'retries': 4}
+        fetcher = Fetcher(**(args | kwargs))
+        self.addCleanup(fetcher.close)
+        return fetcher
+
+
+class TestFetcher(ServerTestCase):
+    """Test downloading pages."""
+
+    def test_fetch_01(self):
+        url = f'{self.site}/florataxon.aspx?flora_id=1&taxon_id=10'
+        self.assertEqual(self.fetcher().fetch(url), b'<html>treatment 10</html>')
+
+    def test_fetch_02(self):
+        path = '/florataxon.aspx?flora_id=1&taxon_id=11'
+        self.server.failures[path] = 2
+        self.assertEqual(
+            self.fetcher().fetch(self.site + path), b'<html>treatment 11</html>')
+        self.assertEqual(self.server.hits.count(path), 3)
+
+    def test_fetch_03(self):
+        with self.assertRaises(FetchError):
+            self.fetcher().fetch(f'{self.site}/missing')
+        self.assertEqual(self.server.hits, ['/missing'])
+
+    def test_fetch_04(self):
+        path = '/florataxon.aspx?flora_id=1&taxon_id=12'
+        self.server.failures[path] = 10
+        with self.assertRaises(FetchError):
+            self.fetcher().fetch(self.site + path)
+        self.assertEqual(self.server.hits.count(path), 4)
+
+    def test_fetch_05(self):
+        self.assertEqual(
+            self.fetcher().fetch(f'{self.site}/moved'),
+            b'<html>treatment 10</html>')
+
+    def test_download_all_01(self):
+        fetcher = self.fetcher(workers=2)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jobs = [(self.site + p, Path(temp_dir) / f'page_{i}.html')
+                    for i, p in enumerate(PAGES)] * 3
+            saved, failures = fetcher.download_all(jobs)
+            self.assertEqual(failures, [])
+            self.assertEqual(len(saved), len(jobs))
+            for url, path in jobs:
+                self.assertEqual(path.read_bytes(), PAGES[url[len(self.site):]])
+            self.assertEqual(list(Path(temp_dir).glob('*.part')), [])
+        # Connections are kept alive & reused by the worker threads
+        self.assertLessEqual(len(self.server.clients), 2)
+
+    def test_download_all_02(self):
+        fetcher = self.fetcher(workers=2)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for batch in range(3):
+                jobs = [(self.site + p, Path(temp_dir) / f'page_{batch}_{i}.html')
+                        for i, p in enumerate(PAGES)]
+                _, failures = fetcher.download_all(jobs)
+                self.assertEqual(failures, [])
+        # The same connections carry every batch
+        self.assertLessEqual(len(self.server.clients), 2)
+
+    def test_download_all_03(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jobs = [(f'{self.site}/missing', Path(temp_dir) / 'missing.html')]
+            saved, failures = self.fetcher().download_all(jobs)
+            self.assertEqual(saved, [])
+            self.assertEqual([f[0] for f in failures], [f'{self.site}/missing'])
+            self.assertFalse((Path(temp_dir) / 'missing.html').exists())
+
+    def test_retries_01(self):
+        with self.assertRaises(ValueError):
+            self.fetcher(retries=0)
+
+
+class TestRefresh(ServerTestCase):
+    """Test conditional downloads of pages we already have."""
+
+    url_path = '/browse.aspx?flora_id=1&start_taxon_id=10'
+
+    def test_refresh_01(self):
+        fetcher = self.fetcher()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'tree.html'
+            first = fetcher.save(self.site + self.url_path, path)
+            self.assertTrue(first.changed)
+            self.assertTrue(first.validators['etag'])
+
+            os.utime(path, (0, 0))
+            second = fetcher.save(self.site + self.url_path, path, first.validators)
+            self.assertFalse(second.changed)
+            self.assertEqual(second.validators, first.validators)
+            self.assertEqual(path.stat().st_mtime, 0)
+
+    def test_refresh_02(self):
+        fetcher = self.fetcher()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'tree.html'
+            path.write_bytes(PAGES[self.url_path])
+            os.utime(path, (0, 0))
+            saved = fetcher.save(
+                self.site + self.url_path, path, file_validators(path))
+            self.assertFalse(saved.changed)
+            self.assertEqual(path.stat().st_mtime, 0)
+
+    def test_refresh_03(self):
+        fetcher = self.fetcher()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'tree.html'
+            path.write_bytes(b'<html>old tree</html>')
+            saved = fetcher.save(
+                self.site + self.url_path, path, file_validators(path))
+            self.assertTrue(saved.changed)
+            self.assertEqual(path.read_bytes(), PAGES[self.url_path])
+
+    def test_refresh_04(self):
+        fetcher = self.fetcher()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'tree.html'
+            first = fetcher.save(self.site + self.url_path, path)
+            path.unlink()
+            saved = fetcher.save(
+                self.site + self.url_path, path, first.validators)
+            self.assertFalse(saved.changed)
+            self.assertEqual(path.read_bytes(), PAGES[self.url_path])
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test the rate limiter."""
+
+    def test_token_bucket_01(self):
+        bucket = TokenBucket(rate=50.0, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+if __name__ == '__main__':
+    unittest.main()
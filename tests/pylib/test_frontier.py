@@ -0,0 +1,72 @@
+"""Test the persistent crawl frontier."""
+
+# pylint: disable=missing-function-docstring
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from efloras.pylib import frontier
+
+
+def page(url, kind='tree', taxon_id=1, page_no=1):
+    return {'url': url, 'kind': kind, 'taxon_id': taxon_id, 'page_no': page_no}
+
+
+class TestFrontier(unittest.TestCase):
+    """Test queueing and draining pages."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cxn = frontier.connect(Path(self.temp_dir.name))
+
+    def tearDown(self):
+        self.cxn.close()
+        self.temp_dir.cleanup()
+
+    def test_frontier_01(self):
+        frontier.add(self.cxn, [page('a'), page('b'), page('a')])
+        self.assertEqual(
+            [p['url'] for p in frontier.pending(self.cxn, 'tree', 10)],
+            ['a', 'b'])
+
+    def test_frontier_02(self):
+        frontier.add(self.cxn, [page('a'), page('t', kind='treatment')])
+        frontier.mark(self.cxn, ['a'], frontier.DONE)
+        frontier.add(self.cxn, [page('a')])
+        self.assertEqual(frontier.pending(self.cxn, 'tree', 10), [])
+        self.assertEqual(
+            frontier.pending(self.cxn, 'treatment', 10),
+            [page('t', kind='treatment')])
+
+    def test_frontier_03(self):
+        frontier.add(self.cxn, [page('a'), page('b')])
+        frontier.mark(self.cxn, ['a'], frontier.FAILED)
+        frontier.mark(self.cxn, ['b'], frontier.DONE)
+        self.cxn.commit()
+
+        # A new connection sees the same state, like a resumed crawl
+        cxn = frontier.connect(Path(self.temp_dir.name))
+        self.assertEqual(frontier.pending(cxn, 'tree', 10), [])
+        frontier.retry_failed(cxn)
+        self.assertEqual(
+            [p['url'] for p in frontier.pending(cxn, 'tree', 10)], ['a'])
+        cxn.close()
+
+    def test_frontier_04(self):
+        frontier.add(self.cxn, [page('a'), page('b')])
+        frontier.reset(self.cxn)
+        self.assertEqual(frontier.counts(self.cxn), {})
+
+    def test_frontier_05(self):
+        frontier.add_changes(self.cxn, [
+            page('t3', kind='treatment', taxon_id=3),
+            page('t1', kind='treatment', taxon_id=1),
+            page('a', taxon_id=2)])
+        self.assertEqual(frontier.changed_taxon_ids(self.cxn), [1, 3])
+        frontier.reset(self.cxn)
+        self.assertEqual(frontier.changed_taxon_ids(self.cxn), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
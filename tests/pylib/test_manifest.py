@@ -0,0 +1,46 @@
+"""Test the manifest of downloaded families."""
+
+# pylint: disable=missing-function-docstring
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from efloras.pylib import manifest, page_store
+
+
+class TestManifest(unittest.TestCase):
+    """Test recording downloaded families."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.cxn = manifest.connect(
+            self.root / 'manifest.sqlite', self.root)
+
+    def tearDown(self):
+        self.cxn.close()
+        self.temp_dir.cleanup()
+
+    def add_pages(self, dir_, flora_id, count):
+        store = page_store.open_store(dir_, flora_id)
+        store.create()
+        for taxon_id in range(count):
+            store.page('treatment', taxon_id).write_bytes(b'page')
+
+    def test_manifest_01(self):
+        dir_ = self.root / 'Pinaceae_1'
+        self.add_pages(dir_, 1, 3)
+        manifest.update(self.cxn, dir_, 'Pinaceae', 1)
+        family = manifest.get_families(self.cxn)[('pinaceae', 1)]
+        self.assertEqual(family['count'], 3)
+        self.assertEqual(family['taxa'], 0)
+        self.assertTrue(family['modified'])
+
+    def test_manifest_02(self):
+        self.add_pages(self.root / 'Pinaceae_1', 1, 2)
+        self.add_pages(self.root / 'Pinaceae_2', 2, 1)
+        manifest.rebuild(self.cxn, self.root)
+        families = manifest.get_families(self.cxn)
+        self.assertEqual(families[('pinaceae', 1)]['count'], 2)
+        self.assertEqual(families[('pinaceae', 2)]['count'], 1)
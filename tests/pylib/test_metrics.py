@@ -0,0 +1,55 @@
+"""Test the reader and writer metrics."""
+
+# pylint: disable=missing-function-docstring
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from efloras.pylib import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    """Test counting, timing, and writing metrics."""
+
+    def setUp(self):
+        metrics.reset()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / 'metrics'
+
+    def tearDown(self):
+        metrics.reset()
+        self.temp_dir.cleanup()
+
+    def test_metrics_01(self):
+        metrics.count('reader.rows')
+        metrics.count('reader.rows', 2)
+        for _ in range(3):
+            with metrics.span('reader'):
+                pass
+        counters, spans = metrics.snapshot()
+        self.assertEqual(counters, {'reader.rows': 3})
+        self.assertEqual(spans['reader']['calls'], 3)
+
+    def test_metrics_02(self):
+        metrics.count('sqlite3.rows_inserted', 5)
+        with metrics.span('sqlite3.insert'):
+            pass
+        metrics.write(self.path, 'log')
+        lines = [json.loads(ln) for ln in self.path.read_text().splitlines()]
+        self.assertEqual(lines[0]['name'], 'sqlite3.rows_inserted')
+        self.assertEqual(lines[0]['value'], 5)
+        self.assertEqual(lines[1]['type'], 'span')
+        self.assertEqual(lines[1]['calls'], 1)
+
+    def test_metrics_03(self):
+        metrics.count('sqlite3.rows_inserted', 5)
+        with metrics.span('sqlite3.insert'):
+            pass
+        metrics.write(self.path, 'prometheus')
+        lines = self.path.read_text().splitlines()
+        self.assertIn('efloras_sqlite3_rows_inserted_total 5', lines)
+        self.assertIn('efloras_sqlite3_insert_calls_total 1', lines)
+        self.assertIn(
+            '# TYPE efloras_sqlite3_insert_seconds_total counter', lines)
@@ -0,0 +1,88 @@
+"""Test the page store backends."""
+
+# pylint: disable=missing-function-docstring
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from efloras.pylib import page_store
+
+
+class TestArchiveStore(unittest.TestCase):
+    """Test keeping pages in a family archive."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        self.store = page_store.open_store(self.dir, 1, 'archive')
+
+    def tearDown(self):
+        self.store.close()
+        self.temp_dir.cleanup()
+
+    def test_archive_store_01(self):
+        page = self.store.page('treatment', 10)
+        self.assertFalse(page.exists())
+        page.write_bytes(b'<p>leaves</p>')
+        self.assertTrue(page.exists())
+        self.assertEqual(page.read_text(), '<p>leaves</p>')
+        self.assertEqual(page.stat().st_size, 13)
+        self.assertEqual(page.name, 'taxon_id_10.html')
+
+    def test_archive_store_02(self):
+        self.store.page('treatment', 10).write_bytes(b'same')
+        self.store.page('treatment', 11).write_bytes(b'same')
+        self.store.page('tree', 10, 2).write_bytes(b'tree')
+        blobs = self.store.cxn.execute('SELECT COUNT(*) FROM blobs;')
+        self.assertEqual(blobs.fetchone()[0], 2)
+        self.assertEqual(
+            [p.name for p in self.store.pages('treatment')],
+            ['taxon_id_10.html', 'taxon_id_11.html'])
+        self.assertEqual(self.store.count('tree'), 1)
+
+    def test_archive_store_03(self):
+        page = self.store.page('treatment', 10)
+        page.write_bytes(b'old')
+        before = self.store.signature('treatment')
+        page.write_bytes(b'new')
+        self.assertNotEqual(self.store.signature('treatment'), before)
+        self.assertEqual(page.read_bytes(), b'new')
+        blobs = self.store.cxn.execute('SELECT COUNT(*) FROM blobs;')
+        self.assertEqual(blobs.fetchone()[0], 1)
+
+    def test_archive_store_04(self):
+        self.store.page('treatment', 10).write_bytes(b'same')
+        self.store.page('treatment', 11).write_bytes(b'same')
+        self.store.page('treatment', 10).write_bytes(b'new')
+        self.assertEqual(self.store.page('treatment', 11).read_bytes(), b'same')
+        blobs = self.store.cxn.execute('SELECT COUNT(*) FROM blobs;')
+        self.assertEqual(blobs.fetchone()[0], 2)
+
+    def test_archive_store_05(self):
+        self.store.page('treatment', 10).write_bytes(b'page')
+        store = page_store.open_store(self.dir, 1)
+        self.assertIsInstance(store, page_store.ArchiveStore)
+        store.close()
+        self.assertEqual(page_store.count_pages(self.dir, 1, 'treatment'), 1)
+        self.assertEqual(page_store.count_pages(self.dir, 2, 'treatment'), 0)
+
+
+class TestFileStore(unittest.TestCase):
+    """Test keeping pages in loose files."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        self.store = page_store.open_store(self.dir, 1)
+        self.store.create()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_file_store_01(self):
+        page = self.store.page('tree', 10, 2)
+        page.write_bytes(b'tree')
+        self.assertEqual(page, self.dir / 'tree' / 'taxon_id_10_2.html')
+        self.assertEqual(self.store.pages('tree'), [page])
+        self.assertEqual(self.store.count('treatment'), 0)
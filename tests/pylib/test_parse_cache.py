@@ -0,0 +1,31 @@
+"""Test the parse cache."""
+
+# pylint: disable=missing-function-docstring
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from efloras.pylib import parse_cache
+
+
+class TestParseCache(unittest.TestCase):
+    """Test saving and reading parsed records."""
+
+    def test_parse_cache_01(self):
+        record = {'ents': [{'start': 0, 'end': 4, 'label': 'size',
+                            'data': {'range': (1.0, 2.5), 'units': 'cm'},
+                            'links': {'part': [1]}}],
+                  'sents': [[0, 20]]}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cxn = parse_cache.connect(Path(temp_dir) / 'parses.sqlite')
+            parse_cache.put(cxn, {'key': record})
+            cached = parse_cache.get(cxn, ['key', 'missing'])
+            cxn.close()
+        self.assertEqual(cached, {'key': record})
+        self.assertIsInstance(
+            cached['key']['ents'][0]['data']['range'], tuple)
+
+
+if __name__ == '__main__':
+    unittest.main()
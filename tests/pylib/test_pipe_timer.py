@@ -0,0 +1,69 @@
+"""Test timing the pipeline components."""
+
+# pylint: disable=missing-function-docstring,too-few-public-methods
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from efloras.pylib import pipe_timer
+
+
+class Upper:
+    """A component without a pipe method."""
+
+    def __call__(self, doc):
+        return [t.upper() for t in doc]
+
+
+class Batched:
+    """A component with a pipe method."""
+
+    def pipe(self, docs, batch_size=1000):
+        for doc in docs:
+            yield doc + ['!']
+
+
+class FakeNLP:
+    """Just enough of a spaCy pipeline."""
+
+    pipeline = [('upper', Upper()), ('batched', Batched())]
+
+    @staticmethod
+    def make_doc(text):
+        return text.split()
+
+
+class TestPipeTimer(unittest.TestCase):
+    """Test timing the pipeline components."""
+
+    def test_pipe_timer_01(self):
+        timings = {}
+        docs = pipe_timer.pipe(FakeNLP(), ['a b', 'c'], timings)
+        self.assertEqual(docs, [['A', 'B', '!'], ['C', '!']])
+        self.assertEqual(list(timings), ['tokenizer', 'upper', 'batched'])
+        self.assertEqual(timings['upper']['docs'], 2)
+        self.assertEqual(timings['upper']['tokens'], 3)
+        self.assertEqual(timings['batched']['tokens'], 5)
+
+    def test_pipe_timer_02(self):
+        total = {}
+        for _ in range(2):
+            timings = {}
+            pipe_timer.pipe(FakeNLP(), ['a b'], timings)
+            pipe_timer.merge(total, timings)
+        self.assertEqual(total['tokenizer']['docs'], 2)
+        self.assertEqual(total['tokenizer']['tokens'], 4)
+
+    def test_pipe_timer_03(self):
+        timings = {'a': {'seconds': 1.0, 'docs': 10, 'tokens': 100},
+                   'b': {'seconds': 3.0, 'docs': 10, 'tokens': 100}}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'profile.json'
+            pipe_timer.report(timings, path)
+            rows = json.loads(path.read_text())
+        self.assertEqual(rows[1]['component'], 'b')
+        self.assertEqual(rows[1]['share'], 0.75)
+        self.assertEqual(rows[0]['docs_per_sec'], 10.0)
+        self.assertEqual(rows[0]['tokens_per_sec'], 100.0)
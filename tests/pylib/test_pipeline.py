@@ -0,0 +1,61 @@
+"""Test that the pipeline profiles find the same traits."""
+
+# pylint: disable=missing-function-docstring
+
+import ast
+import tempfile
+import unittest
+from pathlib import Path
+
+import spacy
+from traiter.util import shorten
+
+from efloras.pylib.pipeline import build_pipeline, pipeline, save_pipeline
+
+PATTERN_TESTS = Path(__file__).resolve().parents[1] / 'patterns'
+
+
+def suite_texts():
+    """Get every text the pattern tests parse."""
+    texts = []
+    for path in sorted(PATTERN_TESTS.glob('test_*.py')):
+        for node in ast.walk(ast.parse(path.read_text())):
+            if (isinstance(node, ast.Call)
+                    and getattr(node.func, 'id', '') == 'test'
+                    and node.args
+                    and isinstance(node.args[0], ast.Constant)):
+                texts.append(shorten(node.args[0].value))
+    return texts
+
+
+class TestPipelineProfiles(unittest.TestCase):
+    """Compare the minimal profile with the full one."""
+
+    def test_profiles_01(self):
+        texts = suite_texts()
+        self.assertTrue(texts)
+
+        full = pipeline(cache=False, profile='full')
+        minimal = pipeline(cache=False, profile='minimal')
+
+        for text, expect, actual in zip(
+                texts, full.pipe(texts), minimal.pipe(texts)):
+            with self.subTest(text=text):
+                self.assertEqual(
+                    [e._.data for e in actual.ents],
+                    [e._.data for e in expect.ents])
+
+
+class TestPipelineCache(unittest.TestCase):
+    """Test saving the pipeline to disk."""
+
+    def test_cache_01(self):
+        text = shorten('Leaf blades 2–4 cm, margins serrate, red to purple.')
+        nlp = build_pipeline()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'full'
+            save_pipeline(nlp, path)
+            loaded = spacy.load(path)
+            expect = [e._.data for e in nlp(text).ents]
+            self.assertTrue(expect)
+            self.assertEqual([e._.data for e in loaded(text).ents], expect)
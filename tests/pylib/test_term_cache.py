@@ -0,0 +1,45 @@
+"""Test the compiled term artifact."""
+
+# pylint: disable=missing-function-docstring
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from efloras.pylib import term_cache
+
+
+class TestTermCache(unittest.TestCase):
+    """Test building and loading the term artifact."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / 'terms.pickle'
+        self.builds = 0
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def build(self):
+        self.builds += 1
+        return {'replace': {'cm': 'cm'}}
+
+    def test_term_cache_01(self):
+        first = term_cache.load(self.path, self.build)
+        second = term_cache.load(self.path, self.build)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(second['replace'], {'cm': 'cm'})
+
+    def test_term_cache_02(self):
+        term_cache.load(self.path, self.build)
+        artifact = term_cache.load(self.path, self.build)
+        artifact['fingerprint'] = 'old'
+        term_cache.save(self.path, artifact)
+        term_cache.load(self.path, self.build)
+        self.assertEqual(self.builds, 2)
+
+    def test_term_cache_03(self):
+        self.path.write_bytes(b'not a pickle')
+        term_cache.load(self.path, self.build)
+        self.assertEqual(self.builds, 1)
@@ -1,12 +1,17 @@
 """Setup for all tests."""
 
+import os
 from typing import Dict, List
 
 from traiter.util import shorten
 
 from efloras.pylib.pipeline import pipeline
 
-NLP = pipeline()  # Singleton for testing
+# Run the suite against another pipeline profile with, for example:
+#   EFLORAS_PIPELINE=minimal python -m unittest discover
+PROFILE = os.environ.get('EFLORAS_PIPELINE', 'full')
+
+NLP = pipeline(cache=False, profile=PROFILE)  # Singleton for testing
 
 
 def test(text: str) -> List[Dict]:
@@ -0,0 +1,148 @@
+"""Test crawling a family from a local stand-in for eFloras."""
+
+# pylint: disable=missing-function-docstring
+
+import contextlib
+import io
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import downloader
+from efloras.pylib import page_store
+from efloras.pylib.fetcher import Fetcher
+
+# Saved pages for a small family: a tree that runs over two pages and links
+# to three treatments
+PAGES = {
+    '/browse.aspx?flora_id=1&start_taxon_id=10': """
+        <html><body><table>
+        <tr><td><a href="florataxon.aspx?flora_id=1&taxon_id=10">Testaceae</a>
+        </td></tr>
+        <tr><td><a href="florataxon.aspx?flora_id=1&taxon_id=11">Testus</a>
+        </td></tr>
+        <tr><td><a href="browse.aspx?flora_id=1&start_taxon_id=10&page=2">2</a>
+        </td></tr>
+        </table></body></html>""",
+    '/browse.aspx?flora_id=1&start_taxon_id=10&page=2': """
+        <html><body><table>
+        <tr><td><a href="florataxon.aspx?flora_id=1&taxon_id=12">Testus albus</a>
+        </td></tr>
+        </table></body></html>""",
+    '/florataxon.aspx?flora_id=1&taxon_id=10': """
+        <html><body><div id="panelTaxonTreatment">
+        <p>Testaceae</p><p>Herbs, perennial. Leaves green.</p>
+        </div></body></html>""",
+    '/florataxon.aspx?flora_id=1&taxon_id=11': """
+        <html><body><div id="panelTaxonTreatment">
+        <p>Testus</p><p>Leaves 2-4 cm, margins serrate.</p>
+        </div></body></html>""",
+    '/florataxon.aspx?flora_id=1&taxon_id=12': """
+        <html><body><div id="panelTaxonTreatment">
+        <p>Testus albus</p><p>Petals 5, white.</p>
+        </div></body></html>""",
+}
+
+TREATMENTS = ['taxon_id_10.html', 'taxon_id_11.html', 'taxon_id_12.html']
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serve the saved pages and fail on request."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        server = self.server
+        with server.lock:
+            server.hits.append(self.path)
+            fail = self.path in server.failing
+
+        if fail:
+            body, status = b'busy', 503
+        elif self.path in PAGES:
+            body, status = PAGES[self.path].encode(), 200
+        else:
+            body, status = b'not found', 404
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestCrawl(unittest.TestCase):
+    """Test downloading a family's tree and treatments."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.lock = threading.Lock()
+        self.server.hits = []
+        self.server.failing = set()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        site = f'http://127.0.0.1:{self.server.server_address[1]}'
+        for patch in (mock.patch.object(downloader, 'SITE', site),
+                      mock.patch.object(downloader, 'family_dir',
+                                        return_value=self.dir)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def download(self, backend=None, **kwargs):
+        """Crawl the test family and return the pages requested."""
+        fetcher = Fetcher(rate=1000.0, burst=10, backoff=0.01, retries=2)
+        store = page_store.open_store(self.dir, 1, backend)
+        store.create()
+        hits = len(self.server.hits)
+        with contextlib.redirect_stdout(io.StringIO()):
+            downloader.download(fetcher, store, 'Testaceae', 1, 10, **kwargs)
+        store.close()
+        fetcher.close()
+        return self.server.hits[hits:]
+
+    def test_crawl_01(self):
+        hits = self.download('archive')
+        self.assertEqual(sorted(hits), sorted(PAGES))
+        store = page_store.open_store(self.dir, 1)
+        self.assertIsInstance(store, page_store.ArchiveStore)
+        self.assertEqual(
+            [p.name for p in store.pages('treatment')], TREATMENTS)
+        self.assertEqual(store.count('tree'), 2)
+        store.close()
+
+    def test_crawl_02(self):
+        self.download('archive')
+        self.assertEqual(self.download(), [])
+        self.assertEqual(list(self.dir.glob('**/*.html')), [])
+
+    def test_crawl_03(self):
+        missing = '/florataxon.aspx?flora_id=1&taxon_id=11'
+        self.server.failing.add(missing)
+        hits = self.download()
+        self.assertIn(missing, hits)
+        self.assertFalse((self.dir / 'treatments' / 'taxon_id_11.html').exists())
+
+        self.server.failing.clear()
+        self.assertEqual(self.download(resume=True), [missing])
+        store = page_store.open_store(self.dir, 1)
+        self.assertEqual(
+            [p.name for p in store.pages('treatment')], TREATMENTS)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Test the CSV writer."""
+
+# pylint: disable=missing-function-docstring
+
+import copy
+import csv
+import io
+import unittest
+from types import SimpleNamespace
+
+import pandas as pd
+
+from efloras.pylib.util import convert
+from efloras.writers.csv_ import build_columns, column_blocks, csv_writer
+
+ROWS = [
+    {'taxon': 'Abies alba', 'flora_id': 1, 'sents': [], 'ents': [
+        {'data': {'trait': 'count', 'part': 'leaf', 'low': 5}},
+        {'data': {'trait': 'color', 'part': 'petal', 'color': 'red'}},
+    ]},
+    {'taxon': 'Abies grandis', 'flora_id': 1, 'sents': [], 'ents': []},
+    {'taxon': 'Pinus strobus', 'flora_id': 2, 'sents': [], 'ents': [
+        {'data': {'trait': 'size', 'part': 'leaf', 'length_low': 2.5,
+                  'length_units': 'cm'}},
+        {'data': {'trait': 'count', 'part': 'leaf', 'low': 2.5}},
+        {'data': {'trait': 'count', 'part': 'cone', 'low': 3}},
+    ]},
+]
+
+
+def old_csv_writer(rows):
+    """Write rows with a data frame the way the writer did before."""
+    views = []
+    for row in rows:
+        view = {k: v for k, v in row.items() if k not in ('ents', 'sents')}
+        view['raw_traits'] = [e['data'] for e in row['ents']]
+        views.append(build_columns(view))
+
+    out = io.StringIO()
+    pd.DataFrame(views).to_csv(out, index=False)
+    return out.getvalue()
+
+
+def new_csv_writer(rows, chunk_size=1000):
+    out = io.StringIO()
+    csv_writer(SimpleNamespace(csv_file=out, chunk_size=chunk_size), rows)
+    return out.getvalue()
+
+
+class TestSizes(unittest.TestCase):
+    """Test normalizing size units in bulk."""
+
+    def test_sizes_01(self):
+        row = {'raw_traits': [
+            {'trait': 'size', 'part': 'leaf', 'length_low': 2.5,
+             'length_high': 4.0, 'length_units': 'cm', 'width_low': 3,
+             'width_units': 'mm'},
+            {'trait': 'size', 'part': 'leaf', 'length_low': 1.5,
+             'length_units': 'dm', 'thickness_units': 'mm'},
+            {'trait': 'size', 'part': 'sepal', 'length_low': 7.0},
+        ]}
+        row = build_columns(row)
+        del row['raw_traits']
+        self.assertEqual(row, {
+            'leaf_size.1.length_low': convert(2.5, 'cm'),
+            'leaf_size.1.length_high': convert(4.0, 'cm'),
+            'leaf_size.1.length_units': 'cm',
+            'leaf_size.1.width_low': convert(3, 'mm'),
+            'leaf_size.1.width_units': 'mm',
+            'leaf_size.2.length_low': convert(1.5, 'dm'),
+            'leaf_size.2.length_units': 'dm',
+            'leaf_size.2.thickness_units': 'mm',
+            'sepal_size.1.length_low': convert(7.0, None),
+        })
+
+    def test_sizes_02(self):
+        row = {'raw_traits': [
+            {'trait': 'color', 'part': 'petal', 'color': 'red'},
+            {'trait': 'color', 'part': 'petal', 'color': 'purple'},
+        ]}
+        row = build_columns(row)
+        self.assertEqual(row['petal_color'], 'purple, red')
+
+    def test_sizes_03(self):
+        row = {'raw_traits': [
+            {'trait': 'size', 'part': 'leaf', 'length_low': 'big',
+             'length_units': 'cm'},
+        ]}
+        with self.assertRaises(TypeError):
+            build_columns(row)
+
+
+class TestCsvWriter(unittest.TestCase):
+    """Test writing the CSV from typed columns."""
+
+    def test_csv_writer_01(self):
+        expect = old_csv_writer(copy.deepcopy(ROWS))
+        self.assertEqual(new_csv_writer(copy.deepcopy(ROWS)), expect)
+        self.assertEqual(new_csv_writer(copy.deepcopy(ROWS), 1), expect)
+
+    def test_csv_writer_02(self):
+        lines = list(csv.DictReader(io.StringIO(new_csv_writer(ROWS))))
+        self.assertEqual(
+            [r['flora_id'] for r in lines], ['1', '1', '2'])
+        self.assertEqual(
+            [r['leaf_count.1.low'] for r in lines], ['5.0', '', '2.5'])
+        self.assertEqual(
+            [r['cone_count.1.low'] for r in lines], ['', '', '3.0'])
+        self.assertEqual(
+            [r['leaf_size.1.length_low'] for r in lines], ['', '', '25.0'])
+
+    def test_column_blocks_01(self):
+        rows = [{'a': 1}, {'a': 2, 'b': 'x'}, {'a': None, 'b': 'y'}]
+        schema = {'a': 'int', 'b': 'object'}
+        blocks = list(column_blocks(rows, schema, 10, block_cells=3))
+        self.assertEqual([count for count, _ in blocks], [2, 1])
+        values, present = blocks[1][1]['b']
+        self.assertEqual(values.tolist(), ['y'])
+        self.assertNotIn('a', blocks[1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
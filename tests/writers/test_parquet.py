@@ -0,0 +1,77 @@
+"""Test the Parquet writer."""
+
+# pylint: disable=missing-function-docstring
+
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from efloras.writers.parquet import parquet_writer
+
+ROWS = [
+    {'taxon_id': 10, 'flora_id': 1, 'family': 'Pinaceae', 'taxon': 'Abies alba',
+     'ents': [
+         {'data': {'trait': 'count', 'part': 'leaf', 'low': 5}, 'links': {}},
+         {'data': {'trait': 'color', 'part': 'petal', 'color': 'red',
+                   'uncertain': True, 'sex': None}, 'links': {}},
+     ]},
+    {'taxon_id': 20, 'flora_id': 2, 'family': 'Rosaceae', 'taxon': 'Rosa alba',
+     'ents': [
+         {'data': {'trait': 'count', 'part': 'leaf', 'low': 2.5}, 'links': {}},
+     ]},
+]
+
+
+def write(temp_dir, partition=False, chunk_size=1):
+    args = SimpleNamespace(
+        parquet=temp_dir, partition=partition, chunk_size=chunk_size)
+    parquet_writer(args, ROWS)
+
+
+class TestParquetWriter(unittest.TestCase):
+    """Test writing the trait tables to Parquet files."""
+
+    def test_parquet_01(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write(temp_dir)
+            traits = pq.read_table(Path(temp_dir) / 'traits.parquet')
+            fields = pq.read_table(Path(temp_dir) / 'fields.parquet')
+        self.assertEqual(traits.schema.field('trait_id').type, pa.int64())
+        self.assertEqual(fields.schema.field('number').type, pa.float64())
+        self.assertEqual(traits.column('trait_id').to_pylist(), [1, 2, 3])
+        self.assertEqual(traits.column('family').to_pylist(),
+                         ['Pinaceae', 'Pinaceae', 'Rosaceae'])
+
+        fields = fields.to_pydict()
+        values = {(t, f): (v, n) for t, f, v, n in zip(
+            fields['trait_id'], fields['field'], fields['value'],
+            fields['number'])}
+        self.assertEqual(values[(1, 'low')], ('5', 5.0))
+        self.assertEqual(values[(3, 'low')], ('2.5', 2.5))
+        self.assertEqual(values[(2, 'color')], ('red', None))
+        self.assertEqual(values[(2, 'uncertain')], ('true', None))
+        self.assertEqual(values[(2, 'sex')], (None, None))
+
+    def test_parquet_02(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write(temp_dir, partition=True)
+            root = Path(temp_dir) / 'traits'
+            files = sorted(p.relative_to(root).as_posix()
+                           for p in root.rglob('*.parquet'))
+            traits = pq.read_table(root).to_pydict()
+        self.assertEqual(files, [
+            'flora_id=1/family=Pinaceae/part-0.parquet',
+            'flora_id=2/family=Rosaceae/part-0.parquet'])
+        partitions = sorted(zip(
+            traits['trait_id'], traits['flora_id'], traits['family']))
+        self.assertEqual(
+            [(i, int(f), str(m)) for i, f, m in partitions],
+            [(1, 1, 'Pinaceae'), (2, 1, 'Pinaceae'), (3, 2, 'Rosaceae')])
+
+
+if __name__ == '__main__':
+    unittest.main()